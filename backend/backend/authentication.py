@@ -0,0 +1,9 @@
+from rest_framework.authentication import BaseAuthentication
+
+
+class BatchAuthentication(BaseAuthentication):
+	'''Sub requests of a batch carry the user and token the batch request was
+	authenticated with (set by BatchView, a client can not send them)'''
+
+	def authenticate(self, request):
+		return getattr(request._request, 'batch_auth', None)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from rest_framework import serializers
+
+# headers an item may send, e.g. If-Match for an optimistic update
+ITEM_HEADERS = ('If-Match', 'If-None-Match')
+
+
+class BatchItemSerializer(serializers.Serializer):
+	method = serializers.ChoiceField(choices=['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'])
+	path = serializers.CharField()
+	body = serializers.JSONField(required=False, allow_null=True, default=None)
+	headers = serializers.DictField(child=serializers.CharField(), required=False, default=dict)
+
+	def to_internal_value(self, data):
+		# accept "get", "Get"... the same way the http layer would
+		if isinstance(data, dict) and isinstance(data.get('method'), str):
+			data = {**data, 'method': data['method'].upper()}
+		return super().to_internal_value(data)
+
+	def validate_headers(self, headers):
+		allowed = {name.lower(): name for name in ITEM_HEADERS}
+		unknown = [name for name in headers if name.lower() not in allowed]
+		if unknown:
+			raise serializers.ValidationError(f"Only these headers can be sent: {', '.join(ITEM_HEADERS)}.")
+		return {allowed[name.lower()]: value for name, value in headers.items()}
+
+
+class BatchSerializer(serializers.Serializer):
+	requests = BatchItemSerializer(many=True, allow_empty=False, max_length=settings.BATCH_MAX_REQUESTS)
+	parallel = serializers.BooleanField(default=False)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 	'users',
 	'workspaces',
+	'jobs',
 	'django_extensions',
 	'rest_framework',
 	'rest_framework_simplejwt'
@@ -58,6 +59,8 @@ SIMPLE_JWT = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # last, the first one gives the WWW-Authenticate header of 401s
+        'backend.authentication.BatchAuthentication',
     )}
 
 MIDDLEWARE = [
@@ -151,38 +154,79 @@ CORS_ALLOWED_ORIGINS = [
 	"http://localhost:8080",
 	]
 
-if DEBUG:
-    import logging
-    l = logging.getLogger('django.db.backends')
-    l.setLevel(logging.DEBUG)
-    l.addHandler(logging.StreamHandler())
-
-# LOGGING = {
-#     'version': 1,
-#     'disable_existing_loggers': False,
-#     'filters': {
-#         'require_debug_true': {
-#             '()': 'django.utils.log.RequireDebugTrue',
-#         },
-#     },
-#     'formatters': {
-#         'sql': {
-#             '()': 'django.utils.log.ServerFormatter',
-#             'format': '[{server_time}] {message}',
-#             'style': '{',
-#         }
-#     },
-#     'handlers': {
-#         'console': {
-#             'level': 'DEBUG',
-#             'filters': ['require_debug_true'],
-#             'class': 'logging.StreamHandler',
-#         },
-#     },
-#     'loggers': {
-#         'django.db.backends': {
-#             'level': 'DEBUG',
-#             'handlers': ['console'],
-#         },
-#     }
-# }
+# shared by every process (serve forks workers, locmem would be one cache per worker
+# and an invalidation would only reach one of them). Table made by ./manage.py createcachetable
+CACHES = {
+	'default': {
+		'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+		'LOCATION': 'cache_table',
+	}
+}
+
+# invalidated on task writes, the timeout only covers writes done outside the api (admin, shell)
+STATS_CACHE_TIMEOUT = 300
+
+# task ranks longer than this get the whole board column rebalanced in the background
+RANK_REBALANCE_LENGTH = 12
+
+# rows deleted per transaction when a workspace/project is deleted in the background
+DELETE_CHUNK_SIZE = 500
+
+# ./manage.py run_worker
+JOB_WORKER_CONCURRENCY = 2
+JOB_POLL_INTERVAL = 1 # seconds
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 10 # seconds, doubled after every failed attempt
+JOB_HEARTBEAT = 30 # seconds, how often a running job tells it is alive
+JOB_TIMEOUT = 120 # seconds without heartbeat before another worker takes a running job back
+
+# ./manage.py serve
+SERVE_WORKERS = 0 # 0 = 2 * cpus + 1
+SERVE_MAX_REQUESTS = 1000 # recycle workers to cap memory growth
+SERVE_MAX_REQUESTS_JITTER = 100
+
+# admin lists stop counting rows past this, and show the table statistics' estimate instead
+ADMIN_COUNT_LIMIT = 100000
+
+# POST /batch/ limits
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4
+
+# database aliases holding workspaces and everything inside them, users/auth/jobs stay on 'default'.
+# Empty = no sharding. Order matters, shard n hands out ids from n * 10**12 (see workspaces/sharding.py), e.g.
+# DATABASES['shard_0'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_0.sqlite3'}
+# DATABASES['shard_1'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'shard_1.sqlite3'}
+# WORKSPACE_SHARDS = ['shard_0', 'shard_1']
+WORKSPACE_SHARDS = []
+DATABASE_ROUTERS = ['workspaces.sharding.ShardRouter']
+
+# sql queries on stderr while DEBUG is on, configured by django.setup() instead of at import
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {
+            '()': 'django.utils.log.RequireDebugTrue',
+        },
+    },
+    'formatters': {
+        'sql': {
+            '()': 'django.utils.log.ServerFormatter',
+            'format': '[{server_time}] {message}',
+            'style': '{',
+        }
+    },
+    'handlers': {
+        'console': {
+            'level': 'DEBUG',
+            'filters': ['require_debug_true'],
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'django.db.backends': {
+            'level': 'DEBUG',
+            'handlers': ['console'],
+        },
+    }
+}
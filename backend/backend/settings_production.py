@@ -0,0 +1,24 @@
+'''Production profile: DJANGO_SETTINGS_MODULE=backend.settings_production (or --settings backend.settings_production)
+
+settings.py without the development only apps (admin, django_extensions), with
+DEBUG off (no sql logging) and the browsable api disabled, so a worker has less
+to import before it serves its first request.'''
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *
+
+DEBUG = False
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY:
+    # never sign sessions and tokens with the placeholder from settings.py
+    raise ImproperlyConfigured('Set the SECRET_KEY environment variable to run with backend.settings_production.')
+ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('django.contrib.admin', 'django_extensions')]
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+}
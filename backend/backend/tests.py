@@ -0,0 +1,77 @@
+from unittest import mock
+
+from django.test import TransactionTestCase
+from rest_framework.test import APITestCase, APIClient
+from users.models import User
+from workspaces.models import Workspace, WorkspaceMember, Project, Task
+from workspaces.views import TaskViewSet
+
+
+class BatchTestMixin:
+	def setUp(self):
+		self.user = User.objects.create_user(username="alice", full_name="Alice", password="x-Pass-123")
+		workspace = Workspace.objects.create(name="W", owner=self.user)
+		WorkspaceMember.objects.create(workspace=workspace, user=self.user, role="owner")
+		self.project = Project.objects.create(name="P", workspace=workspace)
+		self.task = Task.objects.create(name="T", project=self.project, rank="V")
+		self.client.force_authenticate(self.user)
+
+	def batch(self, *requests):
+		response = self.client.post("/batch/", {"requests": list(requests)}, format="json")
+		self.assertEqual(response.status_code, 200)
+		return response.json()["results"]
+
+
+class BatchTests(BatchTestMixin, APITestCase):
+	def test_runs_every_item(self):
+		results = self.batch(
+			{"method": "GET", "path": f"/projects/{self.project.id}/"},
+			{"method": "PATCH", "path": f"/tasks/{self.task.id}/", "body": {"name": "renamed"}},
+			{"method": "GET", "path": "/nowhere/"})
+		self.assertEqual([result["status"] for result in results], [200, 200, 404])
+		self.assertEqual(results[1]["body"]["name"], "renamed")
+
+	def test_empty_response(self):
+		results = self.batch({"method": "DELETE", "path": f"/tasks/{self.task.id}/"})
+		self.assertEqual(results, [{"status": 204, "body": None}])
+		self.assertFalse(Task.objects.filter(pk=self.task.pk).exists())
+
+	def test_crashing_item_does_not_fail_the_batch(self):
+		with mock.patch.object(TaskViewSet, "list", side_effect=RuntimeError("boom")), self.assertLogs("backend.views", "ERROR"):
+			results = self.batch(
+				{"method": "GET", "path": "/tasks/"},
+				{"method": "GET", "path": f"/tasks/{self.task.id}/"})
+		self.assertEqual([result["status"] for result in results], [500, 200])
+
+	def test_query_string_and_nested_batch(self):
+		results = self.batch(
+			{"method": "GET", "path": f"/tasks/?page=1"},
+			{"method": "POST", "path": "/batch/", "body": {"requests": []}})
+		self.assertEqual(results[0]["body"]["count"], 1)
+		self.assertEqual(results[1]["status"], 400)
+
+	def test_item_headers(self):
+		version = self.task.version
+		results = self.batch(
+			{"method": "PATCH", "path": f"/tasks/{self.task.id}/", "body": {"name": "a"}, "headers": {"if-match": f'"{version}"'}},
+			{"method": "PATCH", "path": f"/tasks/{self.task.id}/", "body": {"name": "b"}, "headers": {"If-Match": f'"{version}"'}})
+		self.assertEqual([result["status"] for result in results], [200, 412])
+		response = self.client.post("/batch/", {"requests": [{"method": "GET", "path": "/tasks/", "headers": {"Authorization": "Bearer x"}}]}, format="json")
+		self.assertEqual(response.status_code, 400)
+
+	def test_needs_authentication(self):
+		self.client.force_authenticate(None)
+		self.assertEqual(self.client.post("/batch/", {"requests": [{"method": "GET", "path": "/tasks/"}]}, format="json").status_code, 401)
+
+
+class ParallelBatchTests(BatchTestMixin, TransactionTestCase):
+	'''The items run in threads with their own connections, they only see committed rows'''
+	client_class = APIClient
+
+	def test_parallel(self):
+		requests = [{"method": "GET", "path": f"/tasks/{self.task.id}/"}, {"method": "GET", "path": f"/projects/{self.project.id}/"}, {"method": "GET", "path": "/tasks/"}]
+		response = self.client.post("/batch/", {"requests": requests, "parallel": True}, format="json")
+		results = response.json()["results"]
+		self.assertEqual([result["status"] for result in results], [200, 200, 200])
+		self.assertEqual(results[0]["body"]["name"], "T")
+		self.assertEqual(results[2]["body"]["count"], 1)
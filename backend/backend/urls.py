@@ -14,12 +14,19 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
+from .views import BatchView
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
+	path('batch/', BatchView.as_view(), name='batch'),
 	path('', include('users.urls')),
-	path('', include('workspaces.urls'))
+	path('', include('workspaces.urls')),
+	path('', include('jobs.urls')),
 
 ]
+
+# left out by settings_production.py, importing it costs startup time
+if apps.is_installed('django.contrib.admin'):
+	from django.contrib import admin
+	urlpatterns.insert(0, path('admin/', admin.site.urls))
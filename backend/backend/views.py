@@ -0,0 +1,99 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit, unquote_to_bytes
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import resolve, Resolver404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .serializers import BatchSerializer
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger(__name__)
+
+
+class BatchView(APIView):
+	'''Runs many api calls in one round trip.
+	The batch request is authenticated once, every sub request reuses that user
+	(BatchAuthentication) and goes straight to the resolved view (no middleware,
+	no jwt decode again).'''
+	permission_classes = [IsAuthenticated]
+
+	def post(self, request):
+		serializer = BatchSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		items = serializer.validated_data['requests']
+		if serializer.validated_data['parallel'] and all(item['method'] in SAFE_METHODS for item in items):
+			with ThreadPoolExecutor(max_workers=settings.BATCH_MAX_WORKERS) as pool:
+				results = list(pool.map(lambda item: self.dispatch_threaded(request, item), items))
+		else:
+			results = [self.run_item(request, item) for item in items]
+		return Response({"results": results}, status=200)
+
+	def dispatch_threaded(self, request, item):
+		try:
+			return self.run_item(request, item)
+		finally:
+			# every thread opens its own db connection, dont leak them
+			connections.close_all()
+
+	def run_item(self, request, item):
+		'''A sub request that crashes gets a 500 of its own, the other items still run'''
+		try:
+			return self.dispatch_item(request, item)
+		except Exception:
+			logger.exception("batch item %s %s failed", item['method'], item['path'])
+			return {"status": 500, "body": {"detail": "Internal server error."}}
+
+	def build_subrequest(self, request, item):
+		'''A WSGIRequest for the item, with the host, scheme and client of the batch request'''
+		url = urlsplit(item['path'])
+		body = json.dumps(item['body']).encode() if item['body'] is not None else b''
+		meta = request._request.META
+		environ = {
+			'REQUEST_METHOD': item['method'],
+			'SCRIPT_NAME': meta.get('SCRIPT_NAME', ''),
+			# wsgi paths are latin-1 decoded bytes
+			'PATH_INFO': unquote_to_bytes(url.path).decode('iso-8859-1'),
+			'QUERY_STRING': url.query,
+			'SERVER_NAME': meta.get('SERVER_NAME', 'localhost'),
+			'SERVER_PORT': str(meta.get('SERVER_PORT', '80')),
+			'SERVER_PROTOCOL': meta.get('SERVER_PROTOCOL', 'HTTP/1.1'),
+			'REMOTE_ADDR': meta.get('REMOTE_ADDR', ''),
+			'HTTP_HOST': request._request.get_host(),
+			'CONTENT_TYPE': 'application/json',
+			'CONTENT_LENGTH': str(len(body)),
+			'wsgi.input': BytesIO(body),
+			'wsgi.url_scheme': request.scheme,
+		}
+		for name, value in item['headers'].items():
+			environ['HTTP_' + name.upper().replace('-', '_')] = value
+		subrequest = WSGIRequest(environ)
+		# read by BatchAuthentication
+		subrequest.batch_auth = (request.user, request.auth)
+		return subrequest
+
+	def dispatch_item(self, request, item):
+		path = urlsplit(item['path']).path
+		try:
+			match = resolve(path)
+		except Resolver404:
+			return {"status": 404, "body": {"detail": "Not found."}}
+		if not hasattr(match.func, 'cls') or match.func.cls is BatchView:
+			return {"status": 400, "body": {"detail": "Path can not be used inside a batch."}}
+
+		subrequest = self.build_subrequest(request, item)
+		response = match.func(subrequest, *match.args, **match.kwargs)
+		data = getattr(response, 'data', None)
+		if data is None:
+			# e.g. the 204 of a DELETE, the body of a drf Response is only there once rendered
+			if hasattr(response, 'render'):
+				response.render()
+			data = response.content.decode(response.charset) if response.content else None
+		return {"status": response.status_code, "body": data}
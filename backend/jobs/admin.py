@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+	list_display = ['id', 'name', 'status', 'attempts', 'run_at', 'created_by', 'finished_at']
+	list_filter = ['status', 'name']
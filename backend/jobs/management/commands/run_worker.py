@@ -0,0 +1,50 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs.queue import requeue_stale
+from jobs.worker import run_threads
+
+
+class Command(BaseCommand):
+	help = "Runs queued jobs from the jobs table, no external broker needed"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY, help="jobs running at the same time")
+		parser.add_argument("--pool", choices=["thread", "process"], default="thread", help="run jobs in threads or in forked processes")
+		parser.add_argument("--poll-interval", type=float, default=settings.JOB_POLL_INTERVAL, help="seconds to wait when the queue is empty")
+		parser.add_argument("--burst", action="store_true", help="exit once the queue is empty")
+
+	def handle(self, *args, **options):
+		concurrency = options["concurrency"]
+		poll_interval = options["poll_interval"]
+		burst = options["burst"]
+		requeue_stale()
+		self.stdout.write(f"Worker started: {concurrency} {options['pool']}(s)")
+
+		if options["pool"] == "thread":
+			stop = threading.Event()
+			self.handle_signals(stop.set)
+			run_threads(concurrency, stop, poll_interval, burst)
+		else:
+			stop = multiprocessing.Event()
+			# set before forking so the children stop on the same signal
+			self.handle_signals(stop.set)
+			# children must not share the parent's sqlite/postgres connections
+			connections.close_all()
+			processes = [
+				multiprocessing.get_context("fork").Process(target=run_threads, args=(1, stop, poll_interval, burst))
+				for _ in range(concurrency)]
+			for process in processes:
+				process.start()
+			for process in processes:
+				process.join()
+		self.stdout.write("Worker stopped.")
+
+	def handle_signals(self, stop):
+		# finish the running jobs then exit
+		for sig in (signal.SIGINT, signal.SIGTERM):
+			signal.signal(sig, lambda *_: stop())
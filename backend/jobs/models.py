@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+	'''Work queued to run outside the request, picked up by ./manage.py run_worker'''
+	class StatusChoices(models.TextChoices):
+		QUEUED = "queued"
+		RUNNING = "running"
+		DONE = "done"
+		FAILED = "failed"
+
+	name = models.CharField(max_length=100) # name given to jobs.registry.register
+	kwargs = models.JSONField(default=dict, blank=True)
+	key = models.CharField(max_length=200, blank=True, default="") # same key queued twice only runs once
+	status = models.CharField(max_length=10, choices=StatusChoices.choices, default=StatusChoices.QUEUED)
+	attempts = models.PositiveIntegerField(default=0)
+	max_attempts = models.PositiveIntegerField(default=3)
+	run_at = models.DateTimeField(default=timezone.now)
+	locked_by = models.CharField(max_length=100, blank=True, default="")
+	locked_at = models.DateTimeField(null=True, blank=True)
+	result = models.JSONField(null=True, blank=True)
+	error = models.TextField(blank=True, default="")
+	created_by = models.ForeignKey("users.User", null=True, blank=True, on_delete=models.SET_NULL, related_name="jobs")
+	created_at = models.DateTimeField(auto_now_add=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	def __str__(self):
+		return f"{self.name} #{self.id} ({self.status})"
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'run_at']), # claiming the next job
+			models.Index(fields=['key', 'status']),
+		]
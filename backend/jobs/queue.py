@@ -0,0 +1,130 @@
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction, DatabaseError
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from .registry import get_job
+
+
+def enqueue(name, user=None, key="", max_attempts=None, **kwargs):
+	'''Queues a job, it runs once the current transaction commits and a worker picks it up.
+	With a key, nothing is queued if a job with the same key is still waiting.'''
+	if key:
+		queued = Job.objects.filter(key=key, status=Job.StatusChoices.QUEUED).first()
+		if queued:
+			return queued
+	return Job.objects.create(
+		name=name,
+		kwargs=kwargs,
+		key=key,
+		created_by=user,
+		max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS)
+
+
+def _take(job, worker_name, now):
+	return Job.objects.filter(pk=job.pk, status=Job.StatusChoices.QUEUED).update(
+		status=Job.StatusChoices.RUNNING,
+		locked_by=worker_name,
+		locked_at=now,
+		attempts=job.attempts + 1)
+
+
+def claim(worker_name):
+	'''Takes the next due job, or returns None.
+	Postgres/mysql skip rows locked by other workers. sqlite has no row locks and
+	a transaction going from read to write fails right away with "database is
+	locked", so there the conditional UPDATE alone makes sure only one worker
+	gets the job.'''
+	now = timezone.now()
+	jobs = Job.objects.filter(status=Job.StatusChoices.QUEUED, run_at__lte=now).order_by("run_at", "id")
+	if connection.features.has_select_for_update_skip_locked:
+		with transaction.atomic():
+			job = jobs.select_for_update(skip_locked=True).first()
+			claimed = job and _take(job, worker_name, now)
+	else:
+		job = jobs.first()
+		claimed = job and _take(job, worker_name, now)
+	if not claimed:
+		return None
+	job.refresh_from_db()
+	return job
+
+
+def beat(job):
+	'''Tells requeue_stale the worker running job is still alive. False once the job is not ours anymore.'''
+	return bool(Job.objects.filter(pk=job.pk, status=Job.StatusChoices.RUNNING, locked_by=job.locked_by).update(locked_at=timezone.now()))
+
+
+class Heartbeat(threading.Thread):
+	'''beat() every settings.JOB_HEARTBEAT seconds while a job runs, so long jobs
+	(a chunked delete of a big workspace) are not taken for dead and run twice.'''
+	def __init__(self, job):
+		super().__init__(daemon=True)
+		self.job = job
+		self.finished = threading.Event()
+
+	def run(self):
+		try:
+			while not self.finished.wait(settings.JOB_HEARTBEAT):
+				try:
+					beat(self.job)
+				except DatabaseError:
+					pass # busy, try again on the next beat
+		finally:
+			connections.close_all()
+
+	def stop(self):
+		self.finished.set()
+		self.join()
+
+
+def run(job):
+	'''Runs a claimed job. The outcome is only saved while the job is still ours,
+	once requeue_stale took it back another worker owns it.'''
+	heartbeat = Heartbeat(job)
+	heartbeat.start()
+	mine = Job.objects.filter(pk=job.pk, status=Job.StatusChoices.RUNNING, locked_by=job.locked_by)
+	try:
+		result = get_job(job.name)(**job.kwargs)
+	except Exception:
+		if job.attempts < job.max_attempts:
+			# 10s, 20s, 40s... with the default JOB_RETRY_BACKOFF
+			delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+			mine.update(
+				status=Job.StatusChoices.QUEUED,
+				run_at=timezone.now() + timedelta(seconds=delay),
+				error=traceback.format_exc())
+		else:
+			mine.update(
+				status=Job.StatusChoices.FAILED,
+				finished_at=timezone.now(),
+				error=traceback.format_exc())
+		return False
+	finally:
+		heartbeat.stop()
+	mine.update(
+		status=Job.StatusChoices.DONE,
+		finished_at=timezone.now(),
+		result=result,
+		error="")
+	return True
+
+
+def requeue_stale():
+	'''Puts back jobs left running by a worker that died (no heartbeat for settings.JOB_TIMEOUT).
+	A job that was out of attempts fails instead, it likely killed its worker (out of memory...).'''
+	now = timezone.now()
+	stale = Job.objects.filter(status=Job.StatusChoices.RUNNING, locked_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT))
+	stale.filter(attempts__gte=F('max_attempts')).update(
+		status=Job.StatusChoices.FAILED,
+		locked_by="",
+		finished_at=now,
+		error="The worker running it stopped on every attempt.")
+	return stale.update(
+		status=Job.StatusChoices.QUEUED,
+		locked_by="",
+		run_at=now)
@@ -0,0 +1,24 @@
+from django.utils.module_loading import autodiscover_modules
+
+_jobs = {}
+_discovered = False
+
+
+def register(name):
+	'''Makes a function runnable as a job, it is called with the kwargs given to enqueue().'''
+	def decorator(func):
+		_jobs[name] = func
+		return func
+	return decorator
+
+
+def get_job(name):
+	global _discovered
+	if not _discovered:
+		# every app declares its jobs in <app>/jobs.py, like admin.py. Only workers look
+		# them up, so web processes never import them
+		autodiscover_modules('jobs')
+		_discovered = True
+	if name not in _jobs:
+		raise KeyError(f"No job registered as {name!r}")
+	return _jobs[name]
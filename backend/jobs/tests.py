@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .models import Job
+from .queue import enqueue, claim, run, beat, requeue_stale
+from .registry import register
+
+calls = []
+
+
+@register("test.slow")
+def slow(seconds):
+	calls.append(seconds)
+	time.sleep(seconds)
+	return "ok"
+
+
+class RequeueTests(TestCase):
+	def test_dead_worker_job_is_requeued(self):
+		enqueue("test.slow", seconds=0)
+		job = claim("worker-1")
+		Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+		self.assertEqual(requeue_stale(), 1)
+		self.assertEqual(claim("worker-2").attempts, 2)
+
+	def test_heartbeat_keeps_the_job(self):
+		enqueue("test.slow", seconds=0)
+		job = claim("worker-1")
+		Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+		self.assertTrue(beat(job))
+		self.assertEqual(requeue_stale(), 0)
+		self.assertIsNone(claim("worker-2"))
+
+	def test_no_heartbeat_for_a_job_taken_back(self):
+		enqueue("test.slow", seconds=0)
+		job = claim("worker-1")
+		Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+		requeue_stale()
+		self.assertFalse(beat(job))
+
+
+	def test_job_that_kills_its_worker_fails_once_out_of_attempts(self):
+		enqueue("test.slow", max_attempts=2, seconds=0)
+		for attempt in (1, 2):
+			job = claim(f"worker-{attempt}")
+			self.assertEqual(job.attempts, attempt)
+			Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+			requeue_stale()
+		job.refresh_from_db()
+		self.assertEqual(job.status, Job.StatusChoices.FAILED)
+		self.assertIsNone(claim("worker-3"))
+
+	def test_outcome_of_a_job_taken_back_is_not_saved(self):
+		enqueue("test.slow", seconds=0)
+		job = claim("worker-1")
+		Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+		requeue_stale()
+		again = claim("worker-2")
+		self.assertTrue(run(job))
+		again.refresh_from_db()
+		self.assertEqual((again.status, again.locked_by), (Job.StatusChoices.RUNNING, "worker-2"))
+
+
+class HeartbeatTests(TransactionTestCase):
+	@override_settings(JOB_HEARTBEAT=0.05, JOB_TIMEOUT=0.2)
+	def test_long_job_runs_once(self):
+		calls.clear()
+		enqueue("test.slow", seconds=0.6)
+		job = claim("worker-1")
+		started = job.locked_at
+		self.assertTrue(run(job))
+		job.refresh_from_db()
+		self.assertEqual((job.status, job.attempts, calls), (Job.StatusChoices.DONE, 1, [0.6]))
+		self.assertGreater(job.locked_at - started, timedelta(seconds=0.4))
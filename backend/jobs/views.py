@@ -0,0 +1,21 @@
+from rest_framework import viewsets
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
+from .models import Job
+from .serializers import JobSerializer
+
+
+class Pagination(PageNumberPagination):
+	page_size=10
+	max_page_size=50
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+	serializer_class = JobSerializer
+	permission_classes = [IsAuthenticated]
+	pagination_class = Pagination
+
+	def get_queryset(self):
+		user = self.request.user
+		if user.is_superuser or user.is_staff:
+			return Job.objects.order_by('-id')
+		return Job.objects.filter(created_by=user).order_by('-id')
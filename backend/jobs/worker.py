@@ -0,0 +1,46 @@
+import logging
+import os
+import socket
+import threading
+
+from django.db import connections
+from .queue import claim, run, requeue_stale
+
+logger = logging.getLogger(__name__)
+
+
+def work(name, stop, poll_interval, burst=False):
+	'''Runs jobs until stop is set, or until the queue is empty when burst is True.'''
+	try:
+		while not stop.is_set():
+			try:
+				job = claim(name)
+				if job:
+					logger.info("%s running %s", name, job)
+					if not run(job):
+						logger.warning("%s failed %s", name, job)
+					continue
+				if burst:
+					return
+				requeue_stale()
+			except Exception:
+				# database busy/gone, the job (if any) is taken back by requeue_stale later
+				logger.exception("%s could not reach the jobs table", name)
+			stop.wait(poll_interval)
+	finally:
+		connections.close_all()
+
+
+def worker_name(index):
+	return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def run_threads(concurrency, stop, poll_interval, burst=False):
+	threads = [
+		threading.Thread(target=work, args=(worker_name(i), stop, poll_interval, burst), daemon=True)
+		for i in range(concurrency)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		while thread.is_alive():
+			thread.join(poll_interval)
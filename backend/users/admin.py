@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from workspaces.changelist import EstimatedCountPaginator, IndexedSearchMixin
 
 User = get_user_model()
 
 # Register your models here.
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(IndexedSearchMixin, admin.ModelAdmin):
 	list_display = ['id', 'username', 'full_name']
+	search_fields = ['username'] # unique, so already indexed
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Workspace, WorkspaceMember, Project, Task
+from .changelist import EstimatedCountPaginator, IndexedSearchMixin, ForeignKeyInputFilter
 
 def set_default_description(modeladmin, request, queryset):
 	"""Admin action para definir descrição padrão para tasks selecionadas"""
@@ -8,23 +9,62 @@ def set_default_description(modeladmin, request, queryset):
 
 set_default_description.short_description = "Set default description for selected tasks"
 
+class ProjectFilter(ForeignKeyInputFilter):
+	title = 'project'
+	parameter_name = 'project'
+
+class WorkspaceFilter(ForeignKeyInputFilter):
+	title = 'workspace'
+	parameter_name = 'workspace'
+
 @admin.register(Workspace)
-class WorkspaceAdmin(admin.ModelAdmin):
+class WorkspaceAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ['id', 'name', 'description', 'owner', 'created_at']
+    search_fields = ['name']
+    autocomplete_fields = ['owner']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # prefetch, not select_related: users can be on another database (sharding.py)
+        return super().get_queryset(request).prefetch_related('owner')
 
 @admin.register(WorkspaceMember)
 class WorkspaceMemberAdmin(admin.ModelAdmin):
     list_display = ['workspace', 'user', 'role', 'joined_at']
+    list_filter = ['role', WorkspaceFilter]
+    list_select_related = ['workspace']
+    autocomplete_fields = ['workspace', 'user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # also used by the autocomplete widgets, where list_select_related does not apply. __str__ shows both
+        return super().get_queryset(request).select_related('workspace').prefetch_related('user')
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(IndexedSearchMixin, admin.ModelAdmin):
 	list_display = ['id', 'name', 'workspace', 'description']
+	list_filter = [WorkspaceFilter]
+	list_select_related = ['workspace']
+	search_fields = ['name']
+	autocomplete_fields = ['workspace']
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
+
+	def get_queryset(self, request):
+		# also used by the task form's project autocomplete, __str__ shows the workspace name
+		return super().get_queryset(request).select_related('workspace')
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(IndexedSearchMixin, admin.ModelAdmin):
 	list_display = ['id', 'name', 'project', 'status', 'description']
-	list_filter = ['status', 'project']
-	search_fields = ['name', 'description']
+	list_filter = ['status', ProjectFilter]
+	list_select_related = ['project__workspace'] # Project.__str__ shows the workspace name
+	search_fields = ['name']
+	autocomplete_fields = ['project']
+	raw_id_fields = ['labels', 'assignees']
+	paginator = EstimatedCountPaginator
+	show_full_result_count = False
 	actions = [set_default_description]
 	list_editable = ['description']  # Permite editar description diretamente na lista
-
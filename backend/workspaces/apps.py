@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate, pre_delete, pre_save
 
 
 class WorkspacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workspaces'
+
+    def ready(self):
+        from .deletion import delete_user_workspaces
+        from .sharding import reserve_id_range, take_id
+        post_migrate.connect(reserve_id_range, sender=self)
+        pre_save.connect(take_id)
+        pre_delete.connect(delete_user_workspaces, sender=settings.AUTH_USER_MODEL)
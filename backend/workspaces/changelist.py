@@ -0,0 +1,107 @@
+'''Admin changelist helpers for tables too big for the defaults.
+
+The default changelist runs a COUNT(*) over the whole table on every page,
+searches with LIKE '%term%' (a full scan) and builds a sidebar link for every
+row of a filtered foreign key.'''
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections, DatabaseError
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+def estimated_count(model, using):
+	'''Row count from the planner statistics (ANALYZE), None when there are none'''
+	connection = connections[using]
+	table = model._meta.db_table
+	try:
+		with connection.cursor() as cursor:
+			if connection.vendor == "postgresql":
+				cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [connection.ops.quote_name(table)])
+			elif connection.vendor == "sqlite":
+				# first number of any index row is the row count of the table
+				cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+			else:
+				return None
+			row = cursor.fetchone()
+	except DatabaseError:
+		# sqlite_stat1 only exists once ANALYZE ran
+		return None
+	if not row or row[0] is None:
+		return None
+	count = int(str(row[0]).split()[0])
+	return count if count >= 0 else None
+
+
+def parse_id(value):
+	'''value as an id, None when it is not one (isdigit() lets "²" through, int() does
+	not) or does not fit the 64 bit id columns'''
+	try:
+		number = int(value)
+	except ValueError:
+		return None
+	return number if 0 < number < 2 ** 63 else None
+
+
+class EstimatedCountPaginator(Paginator):
+	'''Above settings.ADMIN_COUNT_LIMIT rows the unfiltered list shows the estimated row
+	count, and filtered lists stop counting at the limit, so no page counts millions of rows.'''
+
+	@cached_property
+	def count(self):
+		queryset = self.object_list
+		limit = settings.ADMIN_COUNT_LIMIT
+		if not queryset.query.where:
+			estimate = estimated_count(queryset.model, queryset.db)
+			if estimate is not None and estimate >= limit:
+				return estimate
+		return queryset.order_by()[:limit].count()
+
+
+class IndexedSearchMixin:
+	'''search_fields matched as a prefix with name >= term AND name < term + U+10FFFF,
+	which an index on the column can serve (LIKE '%term%' can not). A number also
+	matches the id. Used by the autocomplete widgets too.'''
+
+	def get_search_results(self, request, queryset, search_term):
+		term = search_term.strip()
+		if not term:
+			return queryset, False
+		query = Q()
+		for field in self.search_fields:
+			query |= Q(**{f"{field}__gte": term, f"{field}__lt": term + "\U0010ffff"})
+		if parse_id(term) is not None:
+			query |= Q(pk=parse_id(term))
+		return queryset.filter(query), False
+
+
+class ForeignKeyInputFilter(admin.SimpleListFilter):
+	'''A text box taking an id or the start of a name instead of one link per related row.
+	Subclasses set title and parameter_name, the foreign key's name.'''
+	template = "admin/input_filter.html"
+
+	def lookups(self, request, model_admin):
+		return ()
+
+	def has_output(self):
+		return True
+
+	def queryset(self, request, queryset):
+		value = (self.value() or "").strip()
+		if not value:
+			return queryset
+		if parse_id(value) is not None:
+			return queryset.filter(**{f"{self.parameter_name}_id": parse_id(value)})
+		return queryset.filter(**{
+			f"{self.parameter_name}__name__gte": value,
+			f"{self.parameter_name}__name__lt": value + "\U0010ffff"})
+
+	def choices(self, changelist):
+		yield {
+			"selected": not self.value(),
+			"query_string": changelist.get_query_string(remove=[self.parameter_name]),
+			"display": "All",
+			"value": self.value() or "",
+			"params": [(name, value) for name, value in changelist.params.items() if name != self.parameter_name],
+		}
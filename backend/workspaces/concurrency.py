@@ -0,0 +1,54 @@
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+
+class PreconditionFailed(APIException):
+	status_code = status.HTTP_412_PRECONDITION_FAILED
+	default_detail = "It was changed by someone else, reload it and try again."
+	default_code = "precondition_failed"
+
+
+class OptimisticUpdateMixin:
+	'''update/partial_update as a single UPDATE ... WHERE id = ? AND version = ?
+
+	The client sends the version it read back in If-Match (the ETag of the
+	object); if someone saved in between, no row matches and the api answers 412
+	instead of silently overwriting. Without If-Match it is still last write wins,
+	and the new version is not known without reading the row again, so the
+	response has "version": null and no ETag.'''
+
+	def get_expected_version(self):
+		header = self.request.headers.get('If-Match')
+		if not header or header.strip() == '*':
+			return None
+		try:
+			return int(header.strip().removeprefix('W/').strip('"'))
+		except ValueError:
+			raise ValidationError({"detail": "If-Match must be the version (ETag) of the object."})
+
+	def versioned_update(self, instance, **fields):
+		rows = type(instance)._default_manager.using(instance._state.db).filter(pk=instance.pk)
+		expected = self.get_expected_version()
+		if expected is not None:
+			rows = rows.filter(version=expected)
+		if not rows.update(**fields, version=F('version') + 1):
+			raise PreconditionFailed()
+		for name, value in fields.items():
+			setattr(instance, name, value)
+		# another write may have landed since the row was read, only If-Match tells the version we replaced
+		instance.version = expected + 1 if expected is not None else None
+
+	def perform_update(self, serializer):
+		instance = serializer.instance
+		data = serializer.validated_data
+		many_to_many = {name: data.pop(name) for name in list(data) if instance._meta.get_field(name).many_to_many}
+		self.versioned_update(instance, **data)
+		for name, values in many_to_many.items():
+			getattr(instance, name).set(values)
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		if self.detail and isinstance(response.data, dict) and response.data.get('version') is not None:
+			response['ETag'] = f'"{response.data["version"]}"'
+		return response
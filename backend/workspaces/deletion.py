@@ -0,0 +1,90 @@
+'''Chunked deletes for workspaces and projects.
+
+Django's cascade collector loads every related row in memory before deleting
+anything and holds the write lock for the whole cascade. Here children are
+deleted with plain DELETE ... WHERE id IN (chunk) statements, one short
+transaction per chunk, while the parent is flagged as deleting and hidden from
+the api.'''
+from django.conf import settings
+from django.db import transaction
+from jobs.queue import enqueue
+from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel
+from .sharding import shards, use_shard, locate_workspace, find_shard
+
+
+def _raw_delete(queryset):
+	# DELETE without the collector, the caller removes every dependent row first
+	return queryset._raw_delete(queryset.db)
+
+
+def _delete_in_chunks(queryset, before_chunk=None):
+	'''Deletes every row of queryset, settings.DELETE_CHUNK_SIZE rows per transaction.'''
+	deleted = 0
+	while True:
+		ids = list(queryset.values_list("id", flat=True)[:settings.DELETE_CHUNK_SIZE])
+		if not ids:
+			return deleted
+		with transaction.atomic(using=queryset.db):
+			if before_chunk:
+				before_chunk(ids)
+			deleted += _raw_delete(queryset.model.objects.filter(id__in=ids))
+
+
+def _delete_task_relations(task_ids):
+	_raw_delete(Task.labels.through.objects.filter(task_id__in=task_ids))
+	_raw_delete(Task.assignees.through.objects.filter(task_id__in=task_ids))
+
+
+def _delete_tasks(tasks):
+	return _delete_in_chunks(tasks, before_chunk=_delete_task_relations)
+
+
+def delete_project(project_id, shard=None):
+	with use_shard(shard or find_shard(Project, project_id)):
+		_delete_tasks(Task.objects.filter(project_id=project_id))
+		_raw_delete(Project.objects.filter(id=project_id))
+
+
+def delete_workspace(workspace_id, shard=None):
+	with use_shard(shard or locate_workspace(workspace_id)):
+		_delete_tasks(Task.objects.filter(project__workspace_id=workspace_id))
+		_delete_in_chunks(Project.objects.filter(workspace_id=workspace_id))
+		_delete_in_chunks(TaskLabel.objects.filter(workspace_id=workspace_id),
+			before_chunk=lambda ids: _raw_delete(Task.labels.through.objects.filter(tasklabel_id__in=ids)))
+		_delete_in_chunks(WorkspaceMember.objects.filter(workspace_id=workspace_id),
+			before_chunk=lambda ids: _raw_delete(Task.assignees.through.objects.filter(workspacemember_id__in=ids)))
+		_raw_delete(Workspace.objects.filter(id=workspace_id))
+
+
+def delete_user_workspaces(sender, instance, **kwargs):
+	'''pre_delete of users. The user foreign keys of workspaces and members are
+	DO_NOTHING, Django's collector would look for them on the user's database
+	while they live on the shards. Here the user's memberships are deleted on
+	every shard and the workspaces they own are deleted in the background.'''
+	for shard in shards():
+		with use_shard(shard):
+			owned = list(Workspace.objects.filter(owner_id=instance.pk, deleting=False).values_list("id", flat=True))
+			Workspace.objects.filter(pk__in=owned).update(deleting=True)
+			WorkspaceMember.objects.filter(user_id=instance.pk).delete()
+		for workspace_id in owned:
+			enqueue("workspaces.delete_workspace", workspace_id=workspace_id, shard=shard)
+
+
+def deletion_status(workspace=None, project=None):
+	'''What is left to delete, for the polling endpoints.'''
+	if workspace:
+		return {
+			"status": "deleting",
+			"projects": Project.objects.filter(workspace=workspace).count(),
+			"tasks": Task.objects.filter(project__workspace=workspace).count(),
+		}
+	return {"status": "deleting", "tasks": Task.objects.filter(project=project).count()}
+
+
+def finish_deletions():
+	'''Deletes everything still flagged as deleting, for when the process died mid way.'''
+	for shard in shards():
+		for project_id in Project.objects.using(shard).filter(deleting=True, workspace__deleting=False).values_list("id", flat=True):
+			delete_project(project_id, shard=shard)
+		for workspace_id in Workspace.objects.using(shard).filter(deleting=True).values_list("id", flat=True):
+			delete_workspace(workspace_id, shard=shard)
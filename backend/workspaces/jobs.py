@@ -0,0 +1,7 @@
+from jobs.registry import register
+from .deletion import delete_workspace, delete_project
+from .ranking import rebalance_ranks
+
+register("workspaces.delete_workspace")(delete_workspace)
+register("workspaces.delete_project")(delete_project)
+register("workspaces.rebalance_ranks")(rebalance_ranks)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from workspaces.deletion import finish_deletions
+
+
+class Command(BaseCommand):
+	help = "Deletes workspaces and projects left flagged as deleting (e.g. the server stopped mid delete)"
+
+	def handle(self, *args, **options):
+		finish_deletions()
+		self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,313 @@
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from workspaces.deletion import delete_workspace
+from workspaces.models import Workspace, WorkspaceMember, Project, Task
+from workspaces.ranking import spread_ranks
+from workspaces.sharding import use_shard, shard_for_new_workspace, shards
+
+User = get_user_model()
+
+SCENARIOS_DIR = settings.BASE_DIR / "loadtests"
+PASSWORD = "loadtest-Pass-123" # only good enough for a DEBUG database
+
+
+class Picker(dict):
+	'''str.format_map context, "{task}" gives a random task of the virtual user and so on'''
+	def __missing__(self, key):
+		raise CommandError(f"Unknown placeholder {{{key}}} in scenario")
+
+	def __getitem__(self, key):
+		value = super().__getitem__(key)
+		return random.choice(value) if isinstance(value, list) else value
+
+
+def fill(value, context):
+	if isinstance(value, str):
+		return value.format_map(context)
+	if isinstance(value, dict):
+		return {k: fill(v, context) for k, v in value.items()}
+	if isinstance(value, list):
+		return [fill(v, context) for v in value]
+	return value
+
+
+def seed(data, password, create=True):
+	'''Creates loadtest_<n> users, each owning a workspace with projects and tasks. Reused between runs,
+	without create only the existing ones are used.'''
+	users = []
+	for n in range(data["users"]):
+		username = f"loadtest_{n}"
+		user = User.objects.filter(username=username).first()
+		if not user and not create:
+			continue
+		if not user:
+			user = User.objects.create_user(username=username, full_name=f"Load Test {n}", password=password)
+		with use_shard(shard_for_new_workspace(user)):
+			workspace = Workspace.objects.filter(owner=user, deleting=False).first()
+			if not workspace and not create:
+				continue
+			if not workspace:
+				workspace = Workspace.objects.create(name=f"Load test {n}", owner=user)
+				WorkspaceMember.objects.create(workspace=workspace, user=user, role="owner")
+				for p in range(data["projects"]):
+					project = Project.objects.create(name=f"Project {p}", workspace=workspace)
+					Task.objects.bulk_create([
+						Task(name=f"Task {t}", project=project, rank=rank)
+						for t, rank in enumerate(spread_ranks(data["tasks"]))])
+			users.append(Picker(
+				username=username,
+				password=password,
+				workspace=workspace.id,
+				project=list(Project.objects.filter(workspace=workspace).values_list("id", flat=True)),
+				task=list(Task.objects.filter(project__workspace=workspace).values_list("id", flat=True)),
+				status=Task.StatusChoices.values))
+	return users
+
+
+def cleanup():
+	'''Deletes the loadtest_<n> users and their workspaces, returns how many users'''
+	users = User.objects.filter(username__startswith="loadtest_")
+	for shard in shards():
+		for workspace_id in Workspace.objects.using(shard).filter(owner__in=list(users.values_list("id", flat=True))).values_list("id", flat=True):
+			delete_workspace(workspace_id, shard=shard)
+	count = users.count()
+	users.delete()
+	return count
+
+
+class WSGITarget:
+	'''Calls the wsgi app in this process, middleware included'''
+	def __init__(self):
+		self.app = get_wsgi_application()
+
+	def request(self, method, path, body, token):
+		path, _, query = path.partition("?")
+		data = json.dumps(body).encode() if body is not None else b""
+		environ = {
+			"REQUEST_METHOD": method,
+			"PATH_INFO": path,
+			"QUERY_STRING": query,
+			"SERVER_NAME": "localhost",
+			"SERVER_PORT": "80",
+			"HTTP_HOST": "localhost",
+			"CONTENT_TYPE": "application/json",
+			"CONTENT_LENGTH": str(len(data)),
+			"wsgi.input": BytesIO(data),
+			"wsgi.url_scheme": "http",
+			"wsgi.errors": BytesIO(),
+		}
+		if token:
+			environ["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+		status = []
+		chunks = self.app(environ, lambda line, headers, exc_info=None: status.append(line))
+		content = b"".join(chunks)
+		if hasattr(chunks, "close"):
+			chunks.close()
+		return int(status[0].split()[0]), content
+
+
+class ASGITarget:
+	'''Calls the asgi app in this process, each virtual user thread drives its own event loop'''
+	def __init__(self):
+		self.app = get_asgi_application()
+		self.local = threading.local()
+
+	def request(self, method, path, body, token):
+		if not hasattr(self.local, "loop"):
+			self.local.loop = asyncio.new_event_loop()
+		return self.local.loop.run_until_complete(self.call(method, path, body, token))
+
+	async def call(self, method, path, body, token):
+		path, _, query = path.partition("?")
+		data = json.dumps(body).encode() if body is not None else b""
+		headers = [(b"host", b"localhost"), (b"content-type", b"application/json"), (b"content-length", str(len(data)).encode())]
+		if token:
+			headers.append((b"authorization", f"Bearer {token}".encode()))
+		scope = {
+			"type": "http",
+			"asgi": {"version": "3.0"},
+			"http_version": "1.1",
+			"method": method,
+			"scheme": "http",
+			"path": path,
+			"raw_path": path.encode(),
+			"query_string": query.encode(),
+			"headers": headers,
+			"server": ("localhost", 80),
+			"client": ("127.0.0.1", 0),
+		}
+		response = {"status": None, "body": b""}
+		messages = [{"type": "http.request", "body": data, "more_body": False}]
+		finished = asyncio.Event()
+
+		async def receive():
+			if messages:
+				return messages.pop()
+			# django listens for the client going away until the response is sent
+			await finished.wait()
+			return {"type": "http.disconnect"}
+
+		async def send(message):
+			if message["type"] == "http.response.start":
+				response["status"] = message["status"]
+			elif message["type"] == "http.response.body":
+				response["body"] += message.get("body", b"")
+				if not message.get("more_body"):
+					finished.set()
+
+		await self.app(scope, receive, send)
+		return response["status"], response["body"]
+
+
+class URLTarget:
+	'''Sends real http requests, e.g. to ./manage.py serve running on this machine'''
+	def __init__(self, url):
+		self.url = url.rstrip("/")
+
+	def request(self, method, path, body, token):
+		data = json.dumps(body).encode() if body is not None else None
+		request = urllib.request.Request(self.url + path, data=data, method=method)
+		request.add_header("Content-Type", "application/json")
+		if token:
+			request.add_header("Authorization", f"Bearer {token}")
+		try:
+			with urllib.request.urlopen(request, timeout=30) as response:
+				return response.status, response.read()
+		except urllib.error.HTTPError as error:
+			return error.code, error.read()
+
+
+def virtual_user(target, steps, context, deadline, max_requests):
+	'''Runs the "once" steps, then weighted random steps until the deadline. Returns {step name: [(seconds, ok)]}'''
+	samples = {}
+	token = None
+	mix = [step for step in steps if not step.get("once")]
+	weights = [step.get("weight", 1) for step in mix]
+
+	def run(step):
+		nonlocal token
+		start = time.perf_counter()
+		try:
+			status, content = target.request(
+				step["method"],
+				fill(step["path"], context),
+				fill(step.get("body"), context),
+				token if step.get("auth", True) else None)
+		except Exception:
+			status, content = None, b""
+		samples.setdefault(step["name"], []).append((time.perf_counter() - start, status is not None and status < 400))
+		if step.get("token") and status == 200:
+			token = json.loads(content)[step["token"]]
+
+	for step in steps:
+		if step.get("once"):
+			run(step)
+	count = 0
+	while mix and time.monotonic() < deadline and not (max_requests and count >= max_requests):
+		run(random.choices(mix, weights)[0])
+		count += 1
+	return samples
+
+
+def percentile(sorted_values, p):
+	return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+class Command(BaseCommand):
+	help = "Runs a scenario from backend/loadtests/ and reports req/s, latency percentiles and errors per endpoint"
+
+	def add_arguments(self, parser):
+		parser.add_argument("scenario", nargs="?", default="default", help="name of a file in backend/loadtests/ or path to a json scenario")
+		parser.add_argument("--target", default="wsgi", help='"wsgi" or "asgi" to run in this process, or a url like http://localhost:8000')
+		parser.add_argument("--concurrency", type=int, default=10, help="virtual users running at the same time")
+		parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+		parser.add_argument("--requests", type=int, default=0, help="stop each virtual user after this many requests (0 = no limit)")
+		parser.add_argument("--seed", action="store_true", help="create the loadtest_<n> users and their data that are missing")
+		parser.add_argument("--password", default=PASSWORD, help="password of the loadtest users")
+		parser.add_argument("--force", action="store_true", help="seed even with DEBUG off, needs your own --password")
+		parser.add_argument("--cleanup", action="store_true", help="delete the loadtest users and their workspaces, then exit")
+
+	def load_scenario(self, name):
+		path = Path(name)
+		if not path.exists():
+			path = SCENARIOS_DIR / f"{name}.json"
+		if not path.exists():
+			raise CommandError(f"Scenario {name} not found, available: {', '.join(p.stem for p in SCENARIOS_DIR.glob('*.json'))}")
+		with open(path) as f:
+			return json.load(f)
+
+	def handle(self, *args, **options):
+		if options["cleanup"]:
+			self.stdout.write(f"Deleted {cleanup()} loadtest users and their workspaces.")
+			return
+		scenario = self.load_scenario(options["scenario"])
+		concurrency = options["concurrency"]
+		if settings.DEBUG and options["target"] in ("wsgi", "asgi"):
+			self.stderr.write(self.style.WARNING("DEBUG is on: sql logging and query recording are part of the numbers."))
+		if options["seed"] and not settings.DEBUG:
+			# users with a known password in what may be the production database
+			if not options["force"]:
+				raise CommandError("DEBUG is off, this may be a real database. Seed anyway with --force --password <password>.")
+			if options["password"] == PASSWORD:
+				raise CommandError("--force needs your own --password.")
+
+		users = seed(scenario["data"], options["password"], create=options["seed"])
+		if not users:
+			raise CommandError("No loadtest users yet, run with --seed first.")
+		contexts = [users[i % len(users)] for i in range(concurrency)]
+		connections.close_all()
+
+		start = time.monotonic()
+		deadline = start + options["duration"]
+		if options["target"] == "wsgi":
+			target = WSGITarget()
+		elif options["target"] == "asgi":
+			target = ASGITarget()
+		else:
+			target = URLTarget(options["target"])
+		results = [None] * concurrency
+
+		def run_thread(i):
+			try:
+				results[i] = virtual_user(target, scenario["steps"], contexts[i], deadline, options["requests"])
+			finally:
+				connections.close_all()
+		threads = [threading.Thread(target=run_thread, args=(i,)) for i in range(concurrency)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.monotonic() - start
+		self.report(results, elapsed, options["target"], concurrency)
+
+	def report(self, results, elapsed, target, concurrency):
+		samples = {}
+		for result in results:
+			for name, values in (result or {}).items():
+				samples.setdefault(name, []).extend(values)
+		everything = [value for values in samples.values() for value in values]
+		self.stdout.write(f"\n{target}, {concurrency} virtual users, {elapsed:.1f}s\n")
+		self.stdout.write(f"{'endpoint':<24}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>10}")
+		for name, values in list(samples.items()) + [("TOTAL", everything)]:
+			if not values:
+				continue
+			latencies = sorted(seconds * 1000 for seconds, _ in values)
+			errors = sum(1 for _, ok in values if not ok) / len(values) * 100
+			self.stdout.write(
+				f"{name:<24}{len(values):>10}{len(values) / elapsed:>10.1f}"
+				f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}{errors:>9.1f}%")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from workspaces.models import Workspace
+from workspaces.sharding import shards, locate_workspace, move_workspace
+
+
+class Command(BaseCommand):
+	help = "Moves a workspace and everything in it to another shard (settings.WORKSPACE_SHARDS), run it while the workspace is idle"
+
+	def add_arguments(self, parser):
+		parser.add_argument("workspace", type=int)
+		parser.add_argument("shard", help="database alias to move it to")
+
+	def handle(self, *args, **options):
+		workspace_id, target = options["workspace"], options["shard"]
+		if target not in shards():
+			raise CommandError(f"{target} is not a shard, available: {', '.join(shards())}")
+		source = locate_workspace(workspace_id)
+		if not Workspace.objects.using(source).filter(pk=workspace_id).exists():
+			raise CommandError(f"Workspace {workspace_id} not found on {source}")
+		if source == target:
+			self.stdout.write(f"Workspace {workspace_id} is already on {target}.")
+			return
+		move_workspace(workspace_id, target)
+		self.stdout.write(self.style.SUCCESS(f"Workspace {workspace_id} moved from {source} to {target}."))
@@ -0,0 +1,166 @@
+import gc
+import multiprocessing
+import os
+import signal
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import get_resolver
+
+
+def process_age():
+	'''Seconds since this process started (linux only, None elsewhere)'''
+	try:
+		with open("/proc/self/stat") as f:
+			started = int(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+		with open("/proc/uptime") as f:
+			return float(f.read().split()[0]) - started
+	except (OSError, ValueError, IndexError):
+		return None
+
+
+def rss(pid):
+	'''Resident memory of pid in MB (linux only, None elsewhere)'''
+	try:
+		with open(f"/proc/{pid}/status") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024
+	except OSError:
+		pass
+	return None
+
+
+def children(pid):
+	'''Child pids of pid (linux only, None elsewhere)'''
+	try:
+		with open(f"/proc/{pid}/task/{pid}/children") as f:
+			return f.read().split()
+	except OSError:
+		return None
+
+
+def preload(mode):
+	'''Loads everything the workers need before forking, so they start warm and share the memory pages'''
+	if mode == "asgi":
+		from django.core.asgi import get_asgi_application
+		application = get_asgi_application()
+	else:
+		from django.core.wsgi import get_wsgi_application
+		application = get_wsgi_application()
+	# imports every urls.py and with them the views, serializers and permissions
+	get_resolver().url_patterns
+	# forked workers must open their own connections
+	connections.close_all()
+	# keep the preloaded objects out of the gc, collecting them would copy their pages in every worker
+	gc.collect()
+	gc.freeze()
+	return application
+
+
+class Command(BaseCommand):
+	help = "Production server: preloads the django app then forks workers (gunicorn, wsgi or asgi)"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--mode", choices=["wsgi", "asgi"], default="wsgi")
+		parser.add_argument("--bind", default="127.0.0.1:8000")
+		parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS or multiprocessing.cpu_count() * 2 + 1)
+		parser.add_argument("--max-requests", type=int, default=settings.SERVE_MAX_REQUESTS, help="recycle a worker after this many requests (0 = never)")
+		parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVE_MAX_REQUESTS_JITTER, help="so workers do not all recycle at once")
+		parser.add_argument("--timeout", type=int, default=30, help="seconds before a stuck worker is killed and replaced")
+		parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds a worker has to finish its requests on reload/stop")
+		parser.add_argument("--pidfile", help="file to write the master pid to, --reload uses it")
+		parser.add_argument("--reload", action="store_true", help="load the code on disk into the server started with --pidfile, without dropping requests, then exit")
+
+	def reload(self, pidfile, timeout):
+		'''USR2 makes the running master exec a new master (new code, same socket),
+		once its workers are up the old master is stopped with TERM: its workers
+		finish their requests and exit. HUP is no good here, with the app
+		preloaded its new workers are forked from the old code.'''
+		if not pidfile:
+			raise CommandError("--reload needs the --pidfile the server was started with")
+		try:
+			old = int(Path(pidfile).read_text())
+		except (OSError, ValueError):
+			raise CommandError(f"No server running with pidfile {pidfile}")
+		# written by the new master while the old one still runs, renamed to pidfile once it is alone
+		new_pidfile = Path(f"{pidfile}.2")
+		new_pidfile.unlink(missing_ok=True)
+		os.kill(old, signal.SIGUSR2)
+		deadline = time.monotonic() + timeout
+		new = None
+		while new is None and time.monotonic() < deadline:
+			try:
+				new = int(new_pidfile.read_text())
+			except (OSError, ValueError):
+				time.sleep(0.2)
+		if new is None:
+			raise CommandError("The new master did not start (see the server log), the old one keeps serving the old code")
+		while children(new) == [] and time.monotonic() < deadline:
+			time.sleep(0.2)
+		# let the workers finish booting (or give them a moment where /proc can not tell)
+		time.sleep(1 if children(new) is not None else 3)
+		os.kill(old, signal.SIGTERM)
+		self.stdout.write(self.style.SUCCESS(f"Master {new} serves the new code, old master {old} stops once its requests are done."))
+
+	def handle(self, *args, **options):
+		if options["reload"]:
+			return self.reload(options["pidfile"], options["timeout"])
+		try:
+			from gunicorn.app.base import BaseApplication
+		except ImportError:
+			raise CommandError("serve needs gunicorn: pip install -r requirements.txt")
+		worker_class = "sync"
+		if options["mode"] == "asgi":
+			try:
+				import uvicorn_worker
+			except ImportError:
+				raise CommandError("asgi mode needs uvicorn: pip install uvicorn-worker")
+			worker_class = "uvicorn_worker.UvicornWorker"
+		if settings.DEBUG:
+			self.stderr.write(self.style.WARNING("DEBUG is on, turn it off in production."))
+
+		loading = time.monotonic()
+		application = preload(options["mode"])
+		preload_time = time.monotonic() - loading
+		stdout = self.stdout
+
+		def when_ready(server):
+			age = process_age()
+			stdout.write(
+				f"App preloaded in {preload_time * 1000:.0f}ms"
+				+ (f", ready {age:.2f}s after process start" if age is not None else "")
+				+ f", master rss {rss(os.getpid()) or 0:.1f}MB")
+
+		def post_worker_init(worker):
+			stdout.write(f"Worker {worker.pid} up, rss {rss(worker.pid) or 0:.1f}MB")
+
+		def worker_exit(server, worker):
+			stdout.write(f"Worker {worker.pid} exiting after {worker.nr} requests, rss {rss(worker.pid) or 0:.1f}MB")
+
+		class PreloadedApplication(BaseApplication):
+			def load_config(self):
+				config = {
+					"bind": options["bind"],
+					"workers": options["workers"],
+					"worker_class": worker_class,
+					"max_requests": options["max_requests"],
+					"max_requests_jitter": options["max_requests_jitter"],
+					"timeout": options["timeout"],
+					"graceful_timeout": options["graceful_timeout"],
+					"preload_app": True,
+					"pidfile": options["pidfile"],
+					"when_ready": when_ready,
+					"post_worker_init": post_worker_init,
+					"worker_exit": worker_exit,
+				}
+				for key, value in config.items():
+					self.cfg.set(key, value)
+
+			def load(self):
+				return application
+
+		PreloadedApplication().run()
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh `python -X importtime` so nothing is imported yet, prints its timings as json
+CHILD = r'''
+import json, sys, time
+start = time.perf_counter()
+timings = {"ready": {}}
+
+from django.apps.config import AppConfig
+create = AppConfig.create.__func__
+def timed_create(cls, entry):
+	app_config = create(cls, entry)
+	ready = app_config.ready
+	def timed_ready():
+		began = time.perf_counter()
+		ready()
+		timings["ready"][app_config.label] = time.perf_counter() - began
+	app_config.ready = timed_ready
+	return app_config
+AppConfig.create = classmethod(timed_create)
+
+from django.conf import settings
+began = time.perf_counter()
+settings.INSTALLED_APPS
+timings["settings"] = time.perf_counter() - began
+
+import django
+began = time.perf_counter()
+django.setup()
+timings["setup"] = time.perf_counter() - began
+
+from django.core.handlers.wsgi import WSGIHandler
+from io import BytesIO
+began = time.perf_counter()
+application = WSGIHandler()
+environ = {
+	"REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[1], "QUERY_STRING": "", "SERVER_NAME": "localhost",
+	"SERVER_PORT": "80", "HTTP_HOST": "localhost", "wsgi.input": BytesIO(), "wsgi.url_scheme": "http", "wsgi.errors": BytesIO(),
+}
+status = []
+b"".join(application(environ, lambda line, headers, exc_info=None: status.append(line)))
+timings["request"] = time.perf_counter() - began
+timings["status"] = status[0]
+timings["total"] = time.perf_counter() - start
+sys.stdout.write(json.dumps(timings))
+'''
+
+
+def parse_importtime(stderr):
+	'''[(module, self seconds, cumulative seconds)] from the -X importtime lines'''
+	modules = []
+	for line in stderr.splitlines():
+		if not line.startswith("import time:") or "imported package" in line:
+			continue
+		own, cumulative, name = line[len("import time:"):].split("|")
+		modules.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6))
+	return modules
+
+
+class Command(BaseCommand):
+	help = "Time from process start to first response, split in imports, settings, django.setup() (app ready()) and the first request"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--path", default="/workspaces/", help="path of the first request")
+		parser.add_argument("--top", type=int, default=20, help="how many modules and packages to list")
+		parser.add_argument("--runs", type=int, default=3, help="runs to make, the fastest one is reported (the first ones warm the disk cache)")
+
+	def run_once(self, path):
+		env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get("PYTHONPATH")]))}
+		started = time.perf_counter()
+		child = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD, path], capture_output=True, text=True, env=env, cwd=settings.BASE_DIR)
+		wall = time.perf_counter() - started
+		if child.returncode != 0:
+			raise CommandError(child.stderr.strip().splitlines()[-1])
+		return wall, json.loads(child.stdout), parse_importtime(child.stderr)
+
+	def handle(self, *args, **options):
+		runs = [self.run_once(options["path"]) for _ in range(max(1, options["runs"]))]
+		wall, timings, modules = min(runs, key=lambda run: run[0])
+		top = options["top"]
+		ms = lambda seconds: f"{seconds * 1000:8.1f}ms"
+
+		self.stdout.write(f"\n{os.environ['DJANGO_SETTINGS_MODULE']}: {wall * 1000:.0f}ms from process start to first response ({timings['status']})")
+		self.stdout.write(f"{ms(wall - timings['total'])}  interpreter start")
+		self.stdout.write(f"{ms(timings['settings'])}  settings")
+		self.stdout.write(f"{ms(timings['setup'])}  django.setup(), apps and models")
+		for label, seconds in sorted(timings["ready"].items(), key=lambda item: -item[1]):
+			if seconds >= 0.0001:
+				self.stdout.write(f"{ms(seconds)}      {label}.ready()")
+		self.stdout.write(f"{ms(timings['request'])}  first request {options['path']}, urls, views and middleware")
+		self.stdout.write(f"{len(modules)} modules imported, {sum(own for _, own, _ in modules) * 1000:.0f}ms in imports")
+
+		packages = {}
+		for name, own, _ in modules:
+			package = name.split(".")[0]
+			packages[package] = packages.get(package, 0) + own
+		self.stdout.write(f"\nSlowest packages (own import time of all their modules)")
+		for package, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+			self.stdout.write(f"{ms(seconds)}  {package}")
+		self.stdout.write(f"\nSlowest imports (including what they import)")
+		for name, _, cumulative in sorted(modules, key=lambda module: -module[2])[:top]:
+			self.stdout.write(f"{ms(cumulative)}  {name}")
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.10 on 2026-10-19 17:59
+
+from django.db import migrations, models
+
+# copied from workspaces/ranking.py as it was, the migration must not change with it
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def spread_ranks(count):
+    width = 1
+    while BASE ** width < count + 1:
+        width += 1
+    ranks = []
+    for i in range(1, count + 1):
+        value = i * BASE ** width // (count + 1)
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits = DIGITS[digit] + digits
+        ranks.append(digits.rstrip("0"))
+    return ranks
+
+
+def rank_existing_tasks(apps, schema_editor):
+    Task = apps.get_model('workspaces', 'Task')
+    db_alias = schema_editor.connection.alias
+    columns = Task.objects.using(db_alias).values_list('project_id', 'status').distinct()
+    for project_id, status in columns:
+        tasks = list(Task.objects.using(db_alias).filter(project_id=project_id, status=status).order_by('id').only('id'))
+        for task, rank in zip(tasks, spread_ranks(len(tasks))):
+            task.rank = rank
+        Task.objects.using(db_alias).bulk_update(tasks, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0002_task_project_status_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='workspaces__project_050e08_idx',
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(rank_existing_tasks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'rank'], name='workspaces__project_c5af24_idx'),
+        ),
+    ]
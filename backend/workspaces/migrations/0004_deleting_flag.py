@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0003_task_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+    ]
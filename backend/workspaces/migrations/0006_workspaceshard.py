@@ -0,0 +1,34 @@
+# Generated by Django 5.2.10 on 2026-10-19 18:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0005_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkspaceShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_id', models.BigIntegerField(unique=True)),
+                ('shard', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='workspace',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='my_workspaces', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='workspacemember',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='workspace_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
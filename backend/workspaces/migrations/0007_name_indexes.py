@@ -0,0 +1,27 @@
+# Generated by Django 5.2.10 on 2026-10-19 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0006_workspaceshard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['name'], name='workspaces__name_cdc06c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['name'], name='workspaces__name_ac964a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workspace',
+            index=models.Index(fields=['name'], name='workspaces__name_5adeb1_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.10 on 2026-10-19 18:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0008_cache_table'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='workspace',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='my_workspaces', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='workspacemember',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='workspace_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -20,7 +20,7 @@ class WorkspaceMember(models.Model):
 		VIEWER = "viewer"
 
 	workspace = models.ForeignKey("workspaces.Workspace", related_name="memberships", on_delete=models.CASCADE)
-	user = models.ForeignKey("users.User", on_delete=models.CASCADE,related_name="workspace_memberships")
+	user = models.ForeignKey("users.User", on_delete=models.DO_NOTHING,related_name="workspace_memberships", db_constraint=False) # users can live on another database, see deletion.delete_user_workspaces
 	role = models.CharField(max_length=10, choices=RolesChoices.choices, null=False, default="viewer")
 	joined_at = models.DateTimeField(auto_now_add=True, )
 
@@ -34,21 +34,30 @@ class Workspace(models.Model):
 	name = models.CharField(max_length=100, null=False, default="My Workspace")
 	description = models.CharField(max_length=300, blank=True )
 	#labels= models.ManyToManyField(Label, related_name="labels")
-	owner = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="my_workspaces")
+	owner = models.ForeignKey("users.User", on_delete=models.DO_NOTHING, related_name="my_workspaces", db_constraint=False) # users can live on another database, see deletion.delete_user_workspaces
 	created_at = models.DateField(auto_now_add=True, blank=True)
+	deleting = models.BooleanField(default=False) # hidden from the api while deletion.py removes it
 
 	def __str__(self):
 		return self.name
 
+	class Meta:
+		indexes = [models.Index(fields=['name'])] # admin search, see changelist.py
+
 class Project(models.Model):
 	name = models.CharField(max_length=30, null=False, default="My_Project")
 	workspace = models.ForeignKey("workspaces.Workspace", on_delete=models.CASCADE, related_name="projects")
 	description = models.CharField(max_length=50, blank=True )
 	goal = models.CharField(max_length=300, null=False, default="add project goal here", blank=True)
+	version = models.PositiveIntegerField(default=1) # bumped on every update, sent as ETag
+	deleting = models.BooleanField(default=False) # hidden from the api while deletion.py removes it
 
 	def __str__(self):
 		return f"{self.name} ({self.workspace.name})"
 
+	class Meta:
+		indexes = [models.Index(fields=['name'])] # admin search, see changelist.py
+
 
 class Task(models.Model):
 	class StatusChoices(models.TextChoices):
@@ -63,6 +72,28 @@ class Task(models.Model):
 	description = models.CharField(max_length=100, blank=True, null=True)
 	labels = models.ManyToManyField("workspaces.TaskLabel", related_name="tasks", blank=True)
 	assignees = models.ManyToManyField("workspaces.WorkspaceMember", related_name="tasks", blank=True)
+	rank = models.CharField(max_length=64, blank=True, default="") # position in the board column, see ranking.py
+	version = models.PositiveIntegerField(default=1) # bumped on every update, sent as ETag
 
 	def __str__(self):
 		return f"{self.name} - {self.project.name}"
+
+	def save(self, *args, **kwargs):
+		# the api ranks new tasks itself, this is for the admin and the shell
+		if self._state.adding and not self.rank:
+			from .ranking import rank_at_end
+			self.rank = rank_at_end(self.project_id, self.status)
+		super().save(*args, **kwargs)
+
+	class Meta:
+		# board order, also covers the per status counts for /stats/
+		indexes = [models.Index(fields=['project', 'status', 'rank']), models.Index(fields=['name'])]
+
+
+class WorkspaceShard(models.Model):
+	'''Workspaces moved off the shard their id points to, kept on the default database'''
+	workspace_id = models.BigIntegerField(unique=True)
+	shard = models.CharField(max_length=100)
+
+	def __str__(self):
+		return f"{self.workspace_id} on {self.shard}"
@@ -1,5 +1,4 @@
 from rest_framework import permissions
-from .models import WorkspaceMember
 
 class CanEditWorkspace(permissions.BasePermission):
 	def has_permission(self, request, view):
@@ -18,9 +17,8 @@ class CanEditWorkspace(permissions.BasePermission):
 			return False
 		if request.user.is_staff or request.user.is_superuser:
 			return True
-		membership = WorkspaceMember.objects.filter(
-			workspace=workspace,
-			user=request.user).first()
+		# through the workspace so the query goes to the shard it was loaded from
+		membership = workspace.memberships.filter(user=request.user).first()
 		return membership and membership.role in ['owner', 'admin', 'editor']
 
 class HasWorkspaceAuthority(permissions.BasePermission):
@@ -42,8 +40,5 @@ class HasWorkspaceAuthority(permissions.BasePermission):
 			return False
 		if request.user.is_staff or request.user.is_superuser:
 			return True
-		membership = WorkspaceMember.objects.filter(
-			workspace=workspace,
-			user=request.user
-		).first()
+		membership = workspace.memberships.filter(user=request.user).first()
 		return membership and membership.role in ['owner', 'admin']
\ No newline at end of file
@@ -0,0 +1,86 @@
+'''Fractional ranks for ordering tasks inside a board column.
+
+A rank is a string of base62 digits read as the fraction 0.d1d2d3... so
+comparing two ranks as strings compares their position. There is always room
+between two ranks, which means moving a task only rewrites that task's rank.
+Ranks never end with "0", otherwise nothing could be placed right before them.'''
+from django.db import transaction
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def _midpoint(a, b):
+	# a < b, a == "" means 0 and b is None means 1
+	if b is not None:
+		n = 0
+		while n < len(b) and (a[n] if n < len(a) else "0") == b[n]:
+			n += 1
+		if n > 0:
+			return b[:n] + _midpoint(a[n:], b[n:])
+	digit_a = DIGITS.index(a[0]) if a else 0
+	digit_b = DIGITS.index(b[0]) if b is not None else BASE
+	if digit_b - digit_a > 1:
+		return DIGITS[(digit_a + digit_b) // 2]
+	if b is not None and len(b) > 1:
+		return b[0]
+	return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def rank_between(before=None, after=None):
+	'''Rank that sorts after `before` and before `after`, None meaning the start/end of the column.'''
+	before = before or ""
+	if after is not None and before >= after:
+		raise ValueError(f"{before!r} is not lower than {after!r}")
+	# appending/prepending steps by one digit instead of halving the gap, so keys
+	# grow one char every ~60 moves to the same end of the column instead of every ~6
+	if after is None:
+		for i, digit in enumerate(before):
+			if digit != DIGITS[-1]:
+				return before[:i] + DIGITS[DIGITS.index(digit) + 1]
+	elif not before:
+		for i, digit in enumerate(after):
+			if DIGITS.index(digit) > 1:
+				return after[:i] + DIGITS[DIGITS.index(digit) - 1]
+	return _midpoint(before, after)
+
+
+def spread_ranks(count):
+	'''`count` short ranks evenly spread over the whole range, used to rebalance a column.'''
+	width = 1
+	while BASE ** width < count + 1:
+		width += 1
+	ranks = []
+	for i in range(1, count + 1):
+		value = i * BASE ** width // (count + 1)
+		digits = ""
+		for _ in range(width):
+			value, digit = divmod(value, BASE)
+			digits = DIGITS[digit] + digits
+		ranks.append(digits.rstrip("0"))
+	return ranks
+
+
+def rank_at_end(project_id, status):
+	'''Rank that puts a task at the bottom of a column.'''
+	from .models import Task
+	last = Task.objects.filter(project_id=project_id, status=status).order_by("-rank").values_list("rank", flat=True).first()
+	return rank_between(last, None)
+
+
+def rebalance_ranks(project_id, status, shard=None):
+	'''Rewrites every rank of one column, keeping the current order.'''
+	from .models import Task, Project
+	from .sharding import use_shard, find_shard
+	shard = shard or find_shard(Project, project_id)
+	with use_shard(shard), transaction.atomic(using=shard):
+		tasks = list(Task.objects.filter(project_id=project_id, status=status).order_by("rank", "id").only("id", "rank"))
+		for task, rank in zip(tasks, spread_ranks(len(tasks))):
+			task.rank = rank
+		Task.objects.bulk_update(tasks, ["rank"], batch_size=500)
+
+
+def rebalance_ranks_later(project_id, status, shard=None):
+	'''Queues a rebalance of the column, once per column however many moves ask for it.'''
+	from jobs.queue import enqueue
+	enqueue("workspaces.rebalance_ranks", key=f"rebalance_ranks:{project_id}:{status}", project_id=project_id, status=status, shard=shard)
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from rest_framework import serializers
-from .models import Workspace, WorkspaceMember, Project, Task
+from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel
 from rest_framework.decorators import action
 
 class WorkspaceSerializer(serializers.ModelSerializer):
@@ -34,11 +34,13 @@ class TaskSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Task
 		fields = '__all__'
+		read_only_fields = ['rank', 'version'] # rank is changed through /tasks/<id>/move/ only
 
 class ProjectSerializer(serializers.ModelSerializer):
 	class Meta:
 		model = Project
-		fields = ['id', 'name', 'description', 'goal']
+		fields = ['id', 'name', 'description', 'goal', 'version']
+		read_only_fields = ['version']
 
 
 class ProjectDetailSerializer(serializers.ModelSerializer):
@@ -46,7 +48,8 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
 	#tasks = TaskSerializer(many=True, read_only=True) #Maybe use Nested Serializers?
 	class Meta:
 		model = Project
-		fields = ['id', 'name', 'description', 'workspace', 'goal', 'tasks']
+		fields = ['id', 'name', 'description', 'workspace', 'goal', 'version', 'tasks']
+		read_only_fields = ['version']
 
 	def get_tasks(self, obj):
 		tasks = TaskSerializer(obj.tasks, many = True)
@@ -71,3 +74,16 @@ class ChangeRoleSerializer(serializers.Serializer):
 
 class KickMemberSerializer(serializers.Serializer):
 	username = serializers.CharField()
+
+class MoveTaskSerializer(serializers.Serializer):
+	status = serializers.ChoiceField(choices=Task.StatusChoices.choices, required=False)
+	after = serializers.IntegerField(required=False, allow_null=True) # task right above the new position
+	before = serializers.IntegerField(required=False, allow_null=True) # task right below the new position
+
+class TaskLabelSerializer(serializers.ModelSerializer):
+	class Meta:
+		model = TaskLabel
+		fields = ['id', 'text', 'color']
+
+class LabelTasksSerializer(serializers.Serializer):
+	tasks = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
@@ -0,0 +1,307 @@
+'''Optional per-workspace sharding.
+
+With settings.WORKSPACE_SHARDS set, a workspace and everything inside it
+(projects, tasks, labels, members) live on one of those databases while users,
+auth and jobs stay on "default". Each shard hands out ids from its own range
+(shard n starts at n * ID_SPACING) so ids stay unique across shards and a
+workspace id tells which shard created it. Workspaces moved with
+./manage.py move_workspace are listed in the WorkspaceShard table instead.
+
+Inside a request the viewsets set the "active shard", ShardRouter sends every
+query on a workspaces model without a better hint there. Without
+WORKSPACE_SHARDS every function here answers "default" without touching the
+database.'''
+import itertools
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+ID_SPACING = 10 ** 12
+_active_shard = ContextVar("active_shard", default=None)
+
+
+def sharding_enabled():
+	return bool(settings.WORKSPACE_SHARDS)
+
+
+def shards():
+	return list(settings.WORKSPACE_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def is_sharded(model):
+	return model._meta.app_label == "workspaces" and model._meta.model_name != "workspaceshard"
+
+
+def get_active_shard():
+	return _active_shard.get() or shards()[0]
+
+
+def set_active_shard(shard):
+	_active_shard.set(shard)
+
+
+@contextmanager
+def use_shard(shard):
+	token = _active_shard.set(shard)
+	try:
+		yield shard
+	finally:
+		_active_shard.reset(token)
+
+
+def shard_for_new_workspace(user):
+	'''Spreads owners over the shards, the workspace id then comes from that shard's range'''
+	all_shards = shards()
+	return all_shards[user.pk % len(all_shards)]
+
+
+def _home_shard(pk):
+	# the shard whose id range pk falls in
+	all_shards = shards()
+	try:
+		return all_shards[min(int(pk) // ID_SPACING, len(all_shards) - 1)]
+	except (TypeError, ValueError):
+		return all_shards[0]
+
+
+def locate_workspace(workspace_id):
+	if not sharding_enabled():
+		return DEFAULT_DB_ALIAS
+	from .models import WorkspaceShard
+	try:
+		moved = WorkspaceShard.objects.using(DEFAULT_DB_ALIAS).filter(workspace_id=int(workspace_id)).values_list("shard", flat=True).first()
+	except (TypeError, ValueError):
+		moved = None
+	return moved or _home_shard(workspace_id)
+
+
+def find_shard(model, pk):
+	'''Shard holding that row, for jobs queued without one. Starts with the shard the id was created on.'''
+	if not sharding_enabled():
+		return DEFAULT_DB_ALIAS
+	home = _home_shard(pk)
+	for shard in [home] + [shard for shard in shards() if shard != home]:
+		if model._default_manager.using(shard).filter(pk=pk).exists():
+			return shard
+	return home
+
+
+def user_shards(user):
+	'''Shards where the user is member of at least one workspace (all of them for staff)'''
+	if not sharding_enabled() or user.is_superuser or user.is_staff:
+		return shards()
+	from .models import WorkspaceMember
+	found = [shard for shard in shards() if WorkspaceMember.objects.using(shard).filter(user_id=user.pk).exists()]
+	return found or shards()[:1]
+
+
+class ShardedQuerySet:
+	'''The same queryset on several shards, read only, enough for pagination and get_object.
+	Results come shard after shard, the ordering only applies inside each shard.'''
+	ordered = True
+
+	def __init__(self, querysets):
+		self.querysets = querysets
+		self.model = querysets[0].model
+
+	def count(self):
+		return sum(queryset.count() for queryset in self.querysets)
+
+	def __len__(self):
+		return self.count()
+
+	def __iter__(self):
+		return itertools.chain.from_iterable(self.querysets)
+
+	def __getitem__(self, index):
+		if not isinstance(index, slice):
+			return list(self)[index]
+		start, stop = index.start or 0, index.stop
+		results = []
+		for queryset in self.querysets:
+			if stop is not None and stop <= 0:
+				break
+			size = queryset.count()
+			if start < size:
+				results.extend(queryset[start:stop])
+			start = max(0, start - size)
+			if stop is not None:
+				stop -= size
+		return results
+
+	def get(self, **kwargs):
+		for queryset in self.querysets:
+			obj = queryset.filter(**kwargs).first()
+			if obj is not None:
+				return obj
+		raise self.model.DoesNotExist(f"{self.model._meta.object_name} matching query does not exist.")
+
+
+class ShardedViewSetMixin:
+	'''Works out the shard(s) of a request. Lists read every shard the user has
+	workspaces on, detail routes switch the active shard to the one the object was
+	found on, so plain Model.objects queries in the actions land there too.'''
+
+	def get_workspace_pk(self):
+		'''The workspace id in the url, when the route has one'''
+		return None
+
+	def get_request_shards(self):
+		if not hasattr(self, "_request_shards"):
+			workspace_pk = self.get_workspace_pk()
+			if workspace_pk is not None:
+				self._request_shards = [locate_workspace(workspace_pk)]
+			else:
+				self._request_shards = user_shards(self.request.user)
+		return self._request_shards
+
+	def build_queryset(self):
+		raise NotImplementedError
+
+	def get_queryset(self):
+		querysets = []
+		for shard in self.get_request_shards():
+			with use_shard(shard):
+				querysets.append(self.build_queryset().using(shard))
+		return querysets[0] if len(querysets) == 1 else ShardedQuerySet(querysets)
+
+	def get_object(self):
+		obj = super().get_object()
+		set_active_shard(obj._state.db)
+		return obj
+
+	def initial(self, request, *args, **kwargs):
+		super().initial(request, *args, **kwargs)
+		if request.user and request.user.is_authenticated:
+			set_active_shard(self.get_request_shards()[0])
+
+	def dispatch(self, request, *args, **kwargs):
+		with use_shard(None):
+			return super().dispatch(request, *args, **kwargs)
+
+
+class ShardRouter:
+	'''Always installed by settings, without WORKSPACE_SHARDS every model goes to "default"'''
+
+	def _db(self, model, **hints):
+		if not is_sharded(model):
+			return DEFAULT_DB_ALIAS
+		instance = hints.get("instance")
+		if instance is not None and is_sharded(type(instance)) and instance._state.db:
+			return instance._state.db
+		return get_active_shard()
+
+	db_for_read = _db
+	db_for_write = _db
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# workspaces point at users across databases, the ids are what matters
+		return True
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		if app_label == "workspaces" and model_name != "workspaceshard":
+			return db in shards()
+		return db == DEFAULT_DB_ALIAS
+
+
+def _id_tables():
+	from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel
+	return [model._meta.db_table for model in (Workspace, WorkspaceMember, Project, Task, TaskLabel)]
+
+
+def reset_id_range(using):
+	'''Points the id sequences of a shard after the last id it gave out in its own
+	range, rows moved in from other shards keep their ids and would drag them along'''
+	offset = shards().index(using) * ID_SPACING
+	in_range = lambda value: value is not None and offset <= value < offset + ID_SPACING
+	connection = connections[using]
+	if connection.vendor not in ("sqlite", "postgresql"):
+		warnings.warn(f"Can not reserve an id range on {connection.vendor}, ids of {using} may clash with other shards")
+		return
+	with connection.cursor() as cursor:
+		for table in _id_tables():
+			cursor.execute(f'SELECT MAX(id) FROM "{table}" WHERE id >= %s AND id < %s', [offset, offset + ID_SPACING])
+			used = [offset, cursor.fetchone()[0]]
+			if connection.vendor == "sqlite":
+				cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+				row = cursor.fetchone()
+				last = max(filter(in_range, used + [row and row[0]]))
+				if row is None:
+					cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, last])
+				else:
+					cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [last, table])
+			else:
+				cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+				sequence = cursor.fetchone()[0]
+				cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+				value, called = cursor.fetchone()
+				last = max(filter(in_range, used + [value if called else None]))
+				if last: # an untouched first shard starts at 1 by itself
+					cursor.execute("SELECT setval(%s, %s)", [sequence, last])
+
+
+def reserve_id_range(using, **kwargs):
+	'''post_migrate: makes shard n hand out ids from n * ID_SPACING'''
+	if sharding_enabled() and using in shards():
+		reset_id_range(using)
+
+
+def take_id(sender, instance, raw, using, **kwargs):
+	'''pre_save: SQLite's AUTOINCREMENT gives max(id) + 1 when that is above the
+	sequence, so a workspace moved in from a later shard would pull every new id
+	into that shard's range. Takes the id from the sequence instead.'''
+	if raw or instance.pk is not None or not sharding_enabled() or using not in shards():
+		return
+	connection = connections[using]
+	table = sender._meta.db_table
+	if connection.vendor != "sqlite" or table not in _id_tables():
+		return
+	with connection.cursor() as cursor:
+		cursor.execute("UPDATE sqlite_sequence SET seq = seq + 1 WHERE name = %s RETURNING seq", [table])
+		row = cursor.fetchone()
+	if row is not None:
+		instance.pk = row[0]
+
+
+def _copy(queryset, target, keep_ids=True):
+	batch = []
+	for obj in queryset.iterator(chunk_size=settings.DELETE_CHUNK_SIZE):
+		if not keep_ids:
+			obj.pk = None
+		batch.append(obj)
+		if len(batch) >= settings.DELETE_CHUNK_SIZE:
+			type(obj).objects.using(target).bulk_create(batch)
+			batch = []
+	if batch:
+		type(batch[0]).objects.using(target).bulk_create(batch)
+
+
+def move_workspace(workspace_id, target):
+	'''Copies a workspace to another shard keeping its ids, points the directory at
+	it and deletes the old copy. Writes made to the workspace during the move are
+	lost, run it while the workspace is idle.'''
+	from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel, WorkspaceShard
+	from .deletion import delete_workspace
+	from .stats import invalidate_workspace_stats
+	source = locate_workspace(workspace_id)
+	if source == target:
+		return source
+	tasks = Task.objects.using(source).filter(project__workspace_id=workspace_id)
+	with use_shard(target), transaction.atomic(using=target):
+		_copy(Workspace.objects.using(source).filter(pk=workspace_id), target)
+		_copy(WorkspaceMember.objects.using(source).filter(workspace_id=workspace_id), target)
+		_copy(TaskLabel.objects.using(source).filter(workspace_id=workspace_id), target)
+		_copy(Project.objects.using(source).filter(workspace_id=workspace_id), target)
+		_copy(tasks, target)
+		# link tables ids are never exposed, let the target number them
+		_copy(Task.labels.through.objects.using(source).filter(task__in=tasks), target, keep_ids=False)
+		_copy(Task.assignees.through.objects.using(source).filter(task__in=tasks), target, keep_ids=False)
+		# new rows on the target keep coming from its own range
+		reset_id_range(target)
+	WorkspaceShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(workspace_id=workspace_id, defaults={"shard": target})
+	invalidate_workspace_stats(workspace_id)
+	delete_workspace(workspace_id, shard=source)
+	return source
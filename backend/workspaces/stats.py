@@ -0,0 +1,84 @@
+import logging
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from .models import Task
+
+STATS_KEY = "workspace_stats:{}"
+# changed by every invalidation, cached stats computed under another generation are stale
+GENERATION_KEY = "workspace_stats_generation:{}"
+
+logger = logging.getLogger(__name__)
+
+
+def _empty_counts():
+	return {status: 0 for status in Task.StatusChoices.values}
+
+
+def _compute(workspace_ids):
+	'''One GROUP BY (workspace, project, status) for every workspace asked, served by the (project, status) index.'''
+	stats = {workspace_id: {"workspace": workspace_id, "total": 0, "by_status": _empty_counts(), "projects": {}} for workspace_id in workspace_ids}
+	rows = (Task.objects
+		.filter(project__workspace_id__in=workspace_ids, project__deleting=False)
+		.values_list("project__workspace_id", "project_id", "status")
+		.annotate(count=Count("id"))
+		.order_by())
+	for workspace_id, project_id, status, count in rows:
+		workspace = stats[workspace_id]
+		project = workspace["projects"].setdefault(project_id, {"project": project_id, "total": 0, "by_status": _empty_counts()})
+		project["by_status"][status] = count
+		project["total"] += count
+		workspace["by_status"][status] += count
+		workspace["total"] += count
+	for workspace in stats.values():
+		workspace["projects"] = list(workspace["projects"].values())
+	return stats
+
+
+def get_workspace_stats(workspace_ids):
+	'''Returns {workspace_id: stats}, reading from cache and computing only the missing ones.
+	Counts are cached with the generation read before computing them, so counts
+	computed while a write invalidates them are never served.'''
+	workspace_ids = list(workspace_ids)
+	try:
+		cached = cache.get_many([key.format(workspace_id) for workspace_id in workspace_ids for key in (STATS_KEY, GENERATION_KEY)])
+	except Exception:
+		logger.exception("reading workspace stats from the cache failed")
+		return _compute(workspace_ids)
+	stats = {}
+	generations = {}
+	for workspace_id in workspace_ids:
+		generation = cached.get(GENERATION_KEY.format(workspace_id))
+		hit = cached.get(STATS_KEY.format(workspace_id))
+		if generation is not None and hit is not None and hit[0] == generation:
+			stats[workspace_id] = hit[1]
+		else:
+			generations[workspace_id] = generation
+	if generations:
+		computed = _compute(list(generations))
+		stats.update(computed)
+		try:
+			entries = {}
+			for workspace_id, value in computed.items():
+				generation = generations[workspace_id]
+				if generation is None:
+					# first read (or evicted), start a generation unless a write just did
+					generation = uuid4().hex
+					if not cache.add(GENERATION_KEY.format(workspace_id), generation, None):
+						continue
+				entries[STATS_KEY.format(workspace_id)] = (generation, value)
+			cache.set_many(entries, settings.STATS_CACHE_TIMEOUT)
+		except Exception:
+			logger.exception("writing workspace stats to the cache failed")
+	return stats
+
+
+def invalidate_workspace_stats(workspace_id):
+	'''Call after anything that creates, deletes or moves a task to another status or project.
+	A cache failure is logged, the write that triggered it still succeeds.'''
+	try:
+		cache.set(GENERATION_KEY.format(workspace_id), uuid4().hex, None)
+	except Exception:
+		logger.exception("invalidating the stats of workspace %s failed", workspace_id)
@@ -1,3 +1,411 @@
-from django.test import TestCase
+import random
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from jobs.queue import claim, run
+from users.models import User
+from .deletion import _raw_delete, delete_project, finish_deletions
+from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel
+from .ranking import rank_between, spread_ranks
+from .stats import _compute, invalidate_workspace_stats
+from .sharding import ID_SPACING, locate_workspace, move_workspace, reset_id_range, use_shard
+
+
+class WorkspaceAPITestCase(APITestCase):
+	'''A user owning a workspace with one project'''
+	def setUp(self):
+		self.user = User.objects.create_user(username="alice", full_name="Alice", password="x-Pass-123")
+		self.workspace = Workspace.objects.create(name="W", owner=self.user)
+		WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role="owner")
+		self.project = Project.objects.create(name="P", workspace=self.workspace)
+		self.client.force_authenticate(self.user)
+
+	def create_task(self, name="T"):
+		response = self.client.post(f"/projects/{self.project.id}/create_task/", {"name": name}, format="json")
+		self.assertEqual(response.status_code, 201)
+		return Task.objects.get(project=self.project, name=name)
+
+
+class StatsTests(WorkspaceAPITestCase):
+	def stats(self):
+		return self.client.get(f"/workspaces/{self.workspace.id}/stats/").json()
+
+	def test_cleared_on_task_writes(self):
+		self.assertEqual(self.stats()["total"], 0)
+		task = self.create_task()
+		self.assertEqual(self.stats()["by_status"]["not_started"], 1)
+		self.client.patch(f"/tasks/{task.id}/", {"status": "in_review"}, format="json")
+		self.assertEqual(self.stats()["by_status"], {"not_started": 0, "in_progress": 0, "in_review": 1, "archived": 0})
+		self.client.delete(f"/tasks/{task.id}/")
+		self.assertEqual(self.stats()["total"], 0)
+
+	def test_served_from_cache(self):
+		self.create_task()
+		self.stats()
+		with self.assertNumQueries(2): # the workspace ids, then one cache read for all of them
+			self.client.get("/stats/")
+
+	def test_only_count_changes_clear_the_cache(self):
+		task = self.create_task()
+		with mock.patch("workspaces.views.invalidate_workspace_stats") as invalidate:
+			self.client.patch(f"/tasks/{task.id}/", {"name": "renamed", "description": "d"}, format="json")
+			invalidate.assert_not_called()
+			self.client.patch(f"/tasks/{task.id}/", {"status": "in_progress"}, format="json")
+			invalidate.assert_called_once_with(self.workspace.id)
+
+	def test_counts_computed_during_a_write_are_not_served(self):
+		self.stats()
+		invalidate_workspace_stats(self.workspace.id)
+		def compute_then_write(workspace_ids):
+			counts = _compute(workspace_ids)
+			self.create_task() # lands between the count and the cache write
+			return counts
+		with mock.patch("workspaces.stats._compute", compute_then_write):
+			self.assertEqual(self.stats()["total"], 0)
+		self.assertEqual(self.stats()["total"], 1)
+
+	def test_cache_failure_does_not_fail_writes(self):
+		task = self.create_task()
+		broken = mock.Mock(**{f"{name}.side_effect": DatabaseError("no such table: cache_table") for name in ("get_many", "set", "set_many", "add")})
+		with mock.patch("workspaces.stats.cache", broken), self.assertLogs("workspaces.stats", "ERROR"):
+			response = self.client.patch(f"/tasks/{task.id}/", {"status": "archived"}, format="json")
+			self.assertEqual(response.status_code, 200)
+			self.assertEqual(self.stats()["by_status"]["archived"], 1)
+
+
+class LabelTests(WorkspaceAPITestCase):
+	def test_filter_tasks_by_label(self):
+		tagged, _ = self.create_task("tagged"), self.create_task("other")
+		label = self.client.post(f"/workspaces/{self.workspace.id}/labels/", {"text": "bug"}, format="json").json()
+		self.client.post(f"/workspaces/{self.workspace.id}/labels/{label['id']}/assign/", {"tasks": [tagged.id]}, format="json")
+		response = self.client.get(f"/tasks/?label={label['id']}")
+		self.assertEqual([task["id"] for task in response.json()["results"]], [tagged.id])
+
+	def test_label_must_be_an_id(self):
+		for label in ["abc", "²", "1.5"]:
+			self.assertEqual(self.client.get(f"/tasks/?label={label}").status_code, 400, label)
+
+	def test_concurrent_creates_of_the_same_label(self):
+		url = f"/workspaces/{self.workspace.id}/labels/"
+		self.assertEqual(self.client.post(url, {"text": "bug"}, format="json").status_code, 201)
+		# the other request passed the check before this one saved
+		with mock.patch("workspaces.views.TaskLabelViewSet.check_unique_text"):
+			response = self.client.post(url, {"text": "bug"}, format="json")
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(response.json(), {"detail": "Label already exists in this workspace."})
+
+
+class ConcurrencyTests(WorkspaceAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.task = self.create_task()
+		self.url = f"/tasks/{self.task.id}/"
+
+	def patch(self, data, **headers):
+		return self.client.patch(self.url, data, format="json", headers=headers)
+
+	def test_etag(self):
+		response = self.client.get(self.url)
+		self.assertEqual(response["ETag"], '"1"')
+		self.assertEqual(self.client.get(f"/projects/{self.project.id}/")["ETag"], '"1"')
+
+	def test_update_is_one_conditional_update(self):
+		with CaptureQueriesContext(connection) as queries:
+			response = self.patch({"name": "renamed"}, if_match='"1"')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.json()["version"], response["ETag"]), (2, '"2"'))
+		updates = [query["sql"] for query in queries if query["sql"].startswith("UPDATE")]
+		self.assertEqual(len(updates), 1)
+		self.assertIn('"version" = 1', updates[0].split("WHERE")[1])
+		# task, project, workspace, membership, the update, then labels and assignees for the response
+		with self.assertNumQueries(7):
+			self.assertEqual(self.patch({"name": "again"}, if_match='W/"2"').status_code, 200)
+
+	def test_stale_version_is_refused(self):
+		self.patch({"name": "first"}, if_match='"1"')
+		response = self.patch({"name": "second"}, if_match='"1"')
+		self.assertEqual(response.status_code, 412)
+		self.task.refresh_from_db()
+		self.assertEqual((self.task.name, self.task.version), ("first", 2))
+
+	def test_malformed_if_match(self):
+		self.assertEqual(self.patch({"name": "x"}, if_match="abc").status_code, 400)
+		self.assertEqual(self.patch({"name": "x"}, if_match="*").status_code, 200)
+
+	def test_version_unknown_without_if_match(self):
+		Task.objects.filter(pk=self.task.pk).update(version=5) # someone else saved meanwhile
+		response = self.patch({"name": "renamed"})
+		self.assertEqual(response.status_code, 200)
+		self.assertIsNone(response.json()["version"])
+		self.assertFalse(response.has_header("ETag"))
+		self.task.refresh_from_db()
+		self.assertEqual(self.task.version, 6)
+
+	def test_project(self):
+		url = f"/projects/{self.project.id}/"
+		self.assertEqual(self.client.patch(url, {"name": "P2"}, format="json", headers={"If-Match": '"1"'})["ETag"], '"2"')
+		self.assertEqual(self.client.patch(url, {"name": "P3"}, format="json", headers={"If-Match": '"1"'}).status_code, 412)
+
+
+class DeletionTests(WorkspaceAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.other = Project.objects.create(name="kept", workspace=self.workspace)
+		self.label = TaskLabel.objects.create(text="bug", workspace=self.workspace)
+		self.member = WorkspaceMember.objects.get(workspace=self.workspace)
+		self.tasks = [self.create_task(f"t{i}") for i in range(5)]
+		self.kept = Task.objects.create(name="kept", project=self.other)
+		for task in self.tasks + [self.kept]:
+			task.labels.add(self.label)
+			task.assignees.add(self.member)
+
+	def run_job(self, job_id):
+		job = claim("worker-1")
+		self.assertEqual(job.id, job_id)
+		self.assertTrue(run(job))
+
+	def test_delete_project(self):
+		response = self.client.delete(f"/projects/{self.project.id}/")
+		self.assertEqual(response.status_code, 202)
+		# hidden right away, still there until the job runs
+		self.assertEqual(self.client.get(f"/projects/{self.project.id}/").status_code, 404)
+		self.assertEqual(self.client.get("/tasks/").json()["count"], 1)
+		self.assertEqual(self.client.get(f"/projects/{self.project.id}/deletion/").json(), {"status": "deleting", "tasks": 5})
+		self.assertEqual(self.client.get(f"/workspaces/{self.workspace.id}/stats/").json()["total"], 1)
+
+		self.run_job(response.json()["job"])
+		self.assertEqual(self.client.get(f"/projects/{self.project.id}/deletion/").status_code, 404)
+		self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+		self.assertEqual(list(Task.objects.values_list("name", flat=True)), ["kept"])
+		self.assertEqual(list(Task.labels.through.objects.values_list("task_id", flat=True)), [self.kept.id])
+		self.assertEqual(list(Task.assignees.through.objects.values_list("task_id", flat=True)), [self.kept.id])
+
+	def test_delete_workspace(self):
+		response = self.client.delete(f"/workspaces/{self.workspace.id}/")
+		self.assertEqual(response.status_code, 202)
+		self.assertEqual(self.client.get("/workspaces/").json()["count"], 0)
+		self.assertEqual(self.client.get("/tasks/").json()["count"], 0)
+		self.assertEqual(self.client.get(f"/workspaces/{self.workspace.id}/deletion/").json(), {"status": "deleting", "projects": 2, "tasks": 6})
+
+		self.run_job(response.json()["job"])
+		self.assertEqual(self.client.get(f"/workspaces/{self.workspace.id}/deletion/").status_code, 404)
+		for model in (Workspace, WorkspaceMember, Project, Task, TaskLabel, Task.labels.through, Task.assignees.through):
+			self.assertFalse(model.objects.exists(), model)
+
+	@override_settings(DELETE_CHUNK_SIZE=2)
+	def test_tasks_and_their_links_go_in_chunks(self):
+		with mock.patch("workspaces.deletion._raw_delete", wraps=_raw_delete) as raw_delete:
+			delete_project(self.project.id)
+		deleted = [call.args[0].model for call in raw_delete.call_args_list]
+		# 3 chunks of at most 2 tasks, each one after its label and assignee links
+		self.assertEqual(deleted, [Task.labels.through, Task.assignees.through, Task] * 3 + [Project])
+		self.assertEqual(Task.labels.through.objects.count(), 1)
+
+	def test_finish_deletions(self):
+		Project.objects.filter(pk=self.project.pk).update(deleting=True)
+		finish_deletions()
+		self.assertEqual(list(Project.objects.values_list("name", flat=True)), ["kept"])
+		Workspace.objects.filter(pk=self.workspace.pk).update(deleting=True)
+		finish_deletions()
+		self.assertFalse(Workspace.objects.exists())
+		self.assertFalse(Task.objects.exists())
+
+	def test_raw_delete(self):
+		# private django api, this catches an upgrade that changes it
+		self.assertEqual(_raw_delete(Task.labels.through.objects.filter(task_id=self.kept.id)), 1)
+		self.assertEqual(_raw_delete(Task.assignees.through.objects.filter(task_id=self.kept.id)), 1)
+		self.assertEqual(_raw_delete(Task.objects.filter(pk=self.kept.pk)), 1)
+		self.assertEqual(Task.objects.count(), 5)
+
+
+class AdminTests(TestCase):
+	def setUp(self):
+		self.admin = User.objects.create_superuser(username="root", full_name="Root", password="x-Pass-123")
+		self.client.force_login(self.admin)
+		self.workspace = Workspace.objects.create(name="W", owner=self.admin)
+		self.member = WorkspaceMember.objects.create(workspace=self.workspace, user=self.admin, role="owner")
+		self.projects = [Project.objects.create(name=f"P{i}", workspace=self.workspace) for i in range(20)]
+
+	def autocomplete(self, model_name, field_name, term=""):
+		response = self.client.get("/admin/autocomplete/", {"app_label": "workspaces", "model_name": model_name, "field_name": field_name, "term": term})
+		self.assertEqual(response.status_code, 200)
+		return response.json()["results"]
+
+	def test_autocomplete_does_not_query_per_row(self):
+		# session, user, estimated count, count, then the page of projects with their workspace
+		with self.assertNumQueries(5):
+			self.assertEqual(len(self.autocomplete("task", "project")), 20)
+		self.assertEqual(self.autocomplete("task", "project", str(self.projects[3].id))[0]["text"], "P3 (W)")
+
+	def test_ids_must_be_numbers(self):
+		for value in ["²", "1.5", "99999999999999999999999"]:
+			self.assertEqual(self.client.get("/admin/workspaces/task/", {"project": value}).status_code, 200, value)
+			self.assertEqual(len(self.autocomplete("task", "project", value)), 0, value)
+
+
+class RankTests(SimpleTestCase):
+	def test_between(self):
+		for before, after in [(None, None), ("1", "2"), ("1", "11"), ("V", "W"), ("z", None), (None, "1"), ("zz", None), ("A1", "A2"), (None, "01")]:
+			rank = rank_between(before, after)
+			self.assertLess(before or "", rank)
+			if after is not None:
+				self.assertLess(rank, after)
+			self.assertFalse(rank.endswith("0"), rank)
+
+	def test_rejects_inverted_or_equal_neighbours(self):
+		for before, after in [("W", "V"), ("V", "V"), ("", "")]:
+			with self.assertRaises(ValueError):
+				rank_between(before, after)
+
+	def test_random_moves_keep_order(self):
+		random.seed(4)
+		column = []
+		for _ in range(2000):
+			i = random.randint(0, len(column))
+			rank = rank_between(column[i - 1] if i else None, column[i] if i < len(column) else None)
+			column.insert(i, rank)
+		self.assertEqual(column, sorted(column))
+		self.assertEqual(len(set(column)), len(column))
+		self.assertFalse(any(rank.endswith("0") for rank in column))
+
+	def test_appending_stays_short(self):
+		rank = None
+		for _ in range(1000):
+			rank = rank_between(rank, None)
+		# one char more every ~30 appends, halving the gap would add one every ~6
+		self.assertLessEqual(len(rank), 40)
+
+	def test_spread(self):
+		for count in [0, 1, 2, 61, 62, 1000, 5000]:
+			ranks = spread_ranks(count)
+			self.assertEqual(len(ranks), count)
+			self.assertEqual(ranks, sorted(set(ranks)))
+			self.assertFalse(any(rank == "" or rank.endswith("0") for rank in ranks))
+
+
+class MoveTests(WorkspaceAPITestCase):
+	def setUp(self):
+		super().setUp()
+		self.tasks = [self.create_task(f"t{i}") for i in range(3)]
+
+	def column(self, status="not_started"):
+		return list(Task.objects.filter(project=self.project, status=status).order_by("rank").values_list("name", flat=True))
+
+	def move(self, task, **data):
+		return self.client.post(f"/tasks/{task.id}/move/", data, format="json")
+
+	def test_move_between(self):
+		first, second, third = self.tasks
+		self.assertEqual(self.move(third, after=first.id, before=second.id).status_code, 200)
+		self.assertEqual(self.column(), ["t0", "t2", "t1"])
+		self.move(first, status="in_progress")
+		self.move(second, status="in_progress", before=first.id)
+		self.assertEqual(self.column("in_progress"), ["t1", "t0"])
+
+	def test_inverted_neighbours_are_rejected_without_rebalance(self):
+		first, second, third = self.tasks
+		with mock.patch("workspaces.views.rebalance_ranks") as rebalance:
+			self.assertEqual(self.move(third, after=second.id, before=first.id).status_code, 400)
+		rebalance.assert_not_called()
+
+	def test_equal_neighbours_are_rebalanced(self):
+		Task.objects.filter(project=self.project).update(rank="")
+		first, second, third = self.tasks
+		self.assertEqual(self.move(third, after=first.id, before=second.id).status_code, 200)
+		self.assertEqual(self.column(), ["t0", "t2", "t1"])
+
+	def test_status_change_by_patch_goes_to_the_end_of_the_column(self):
+		first, second, third = self.tasks
+		self.move(third, status="in_progress")
+		self.client.patch(f"/tasks/{second.id}/", {"status": "in_progress"}, format="json")
+		self.client.patch(f"/tasks/{first.id}/", {"status": "in_progress"}, format="json")
+		self.assertEqual(self.column("in_progress"), ["t2", "t1", "t0"])
+		ranks = list(Task.objects.filter(status="in_progress").values_list("rank", flat=True))
+		self.assertEqual(len(set(ranks)), 3)
+
+	def test_tasks_created_outside_the_api_go_to_the_end(self):
+		Task.objects.create(name="shell", project=self.project)
+		self.assertEqual(self.column(), ["t0", "t1", "t2", "shell"])
+
+	def test_patch_without_status_keeps_the_rank(self):
+		rank = self.tasks[1].rank
+		self.client.patch(f"/tasks/{self.tasks[1].id}/", {"name": "renamed"}, format="json")
+		self.tasks[1].refresh_from_db()
+		self.assertEqual(self.tasks[1].rank, rank)
+
+
+@override_settings(WORKSPACE_SHARDS=["default", "shard_1"])
+class ShardTests(TransactionTestCase):
+	'''The test database and a temporary sqlite file as shards. shard_1 is only
+	added once the test case is set up, the runner knows the databases of settings.'''
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.shard_file = tempfile.NamedTemporaryFile(suffix=".sqlite3")
+		connections.settings["shard_1"] = {**connections.settings["default"], "NAME": cls.shard_file.name}
+		cls.databases = {"default", "shard_1"}
+		call_command("migrate", database="shard_1", verbosity=0)
+
+	@classmethod
+	def tearDownClass(cls):
+		super().tearDownClass()
+		connections["shard_1"].close()
+		del connections["shard_1"]
+		del connections.settings["shard_1"]
+		cls.shard_file.close()
+
+	def setUp(self):
+		reset_id_range("default")
+		self.user = User.objects.create_user(username="alice", full_name="Alice", password="x-Pass-123")
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+
+	def create_workspace(self, shard, name, owner=None):
+		owner = owner or self.user
+		with use_shard(shard):
+			workspace = Workspace.objects.create(name=name, owner=owner)
+			WorkspaceMember.objects.create(workspace=workspace, user=owner, role="owner")
+			project = Project.objects.create(name="P", workspace=workspace)
+			Task.objects.create(name="T", project=project, rank="V")
+		return workspace, project
+
+	def test_new_ids_stay_in_the_shard_range_after_a_move(self):
+		for source, target in [("shard_1", "default"), ("default", "shard_1")]:
+			moved, project = self.create_workspace(source, f"from {source}")
+			move_workspace(moved.id, target)
+			self.assertEqual(self.client.get(f"/workspaces/{moved.id}/").status_code, 200)
+
+			created, _ = self.create_workspace(target, f"on {target}")
+			self.assertEqual(created.id // ID_SPACING, ["default", "shard_1"].index(target))
+			self.assertEqual(locate_workspace(created.id), target)
+			self.assertEqual(self.client.get(f"/workspaces/{created.id}/").status_code, 200)
+
+			response = self.client.post(f"/projects/{project.id}/create_task/", {"name": "new"}, format="json")
+			self.assertEqual(response.status_code, 201)
+			task = Task.objects.using(target).get(project=project, name="new")
+			self.assertEqual(task.id // ID_SPACING, ["default", "shard_1"].index(target))
+
+	def test_deleting_a_user_reaches_every_shard(self):
+		bob = User.objects.create_user(username="bob", full_name="Bob", password="x-Pass-123")
+		alices, _ = self.create_workspace("shard_1", "alice's")
+		bobs, _ = self.create_workspace("default", "bob's", owner=bob)
+		with use_shard("shard_1"):
+			member = WorkspaceMember.objects.create(workspace=alices, user=bob, role="editor")
+			Task.objects.get(project__workspace=alices).assignees.add(member)
+
+		bob.delete()
+		with use_shard("shard_1"):
+			self.assertEqual(list(WorkspaceMember.objects.values_list("user_id", flat=True)), [self.user.id])
+			self.assertFalse(Task.assignees.through.objects.exists())
+		self.assertTrue(Workspace.objects.using("default").get(pk=bobs.pk).deleting)
+		job = claim("worker-1")
+		self.assertEqual(job.kwargs, {"workspace_id": bobs.id, "shard": "default"})
+		self.assertTrue(run(job))
+		self.assertFalse(Workspace.objects.using("default").filter(pk=bobs.pk).exists())
+		self.assertTrue(Workspace.objects.using("shard_1").filter(pk=alices.pk).exists())
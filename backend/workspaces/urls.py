@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import WorkspaceViewSet, ProjectViewSet, TaskViewSet
+from .views import WorkspaceViewSet, ProjectViewSet, TaskViewSet, TaskLabelViewSet, StatsView
 
 router = DefaultRouter()
 router.register(r'workspaces', WorkspaceViewSet, basename='workspace')
 router.register(r'projects', ProjectViewSet, basename='project')
 router.register(r'tasks', TaskViewSet, basename='task')
+router.register(r'workspaces/(?P<workspace_pk>[^/.]+)/labels', TaskLabelViewSet, basename='label')
 
 urlpatterns = [
+	path('stats/', StatsView.as_view(), name='stats'),
 	path('', include(router.urls)),
 ]
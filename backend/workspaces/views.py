@@ -1,14 +1,24 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
-from .models import Workspace, WorkspaceMember, Project, Task
+from .models import Workspace, WorkspaceMember, Project, Task, TaskLabel
 from django.contrib.auth import get_user_model
 from .serializers import WorkspaceSerializer, WorkspaceDetailSerializer, ProjectSerializer, ProjectDetailSerializer, TaskSerializer, ChangeRoleSerializer, KickMemberSerializer
-from .serializers import AddMemberSerializer
+from .serializers import AddMemberSerializer, TaskLabelSerializer, LabelTasksSerializer, MoveTaskSerializer
 from .permissions import CanEditWorkspace, HasWorkspaceAuthority
+from .stats import get_workspace_stats, invalidate_workspace_stats
+from .ranking import rank_between, rank_at_end, rebalance_ranks, rebalance_ranks_later
+from .deletion import deletion_status
+from .concurrency import OptimisticUpdateMixin
+from .sharding import ShardedViewSetMixin, user_shards, use_shard, get_active_shard, set_active_shard, shard_for_new_workspace
+from jobs.queue import enqueue
+from rest_framework.views import APIView
 from rest_framework.exceptions import ValidationError, PermissionDenied, NotFound
 
 
@@ -18,14 +28,22 @@ class Pagination(PageNumberPagination):
 	page_size=10
 	max_page_size=50
 
-class WorkspaceViewSet(viewsets.ModelViewSet):
+class WorkspaceViewSet(ShardedViewSetMixin, viewsets.ModelViewSet):
 	pagination_class = Pagination
 	permission_classes = [IsAuthenticated]
-	def get_queryset(self):
+
+	def get_workspace_pk(self):
+		return self.kwargs.get('pk')
+
+	def build_queryset(self):
 		user = self.request.user
+		workspaces = Workspace.objects.all()
+		if self.action != 'deletion':
+			workspaces = workspaces.filter(deleting=False)
+		projects = Prefetch("projects", queryset=Project.objects.filter(deleting=False))
 		if user.is_superuser or user.is_staff:
-			return Workspace.objects.all().prefetch_related("memberships__user", "projects")
-		return Workspace.objects.filter(memberships__user=user).prefetch_related("memberships__user", "projects")
+			return workspaces.prefetch_related("memberships__user", projects)
+		return workspaces.filter(memberships__user=user).prefetch_related("memberships__user", projects)
 		#Ja que vc ja vai buscar workspaces, busca tambem memberships e projects!
 
 
@@ -36,9 +54,17 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
 			return WorkspaceSerializer
 
 	def perform_create(self, serializer):
+		set_active_shard(shard_for_new_workspace(self.request.user))
 		newworkspace = serializer.save(owner = self.request.user)
 		WorkspaceMember.objects.create(workspace=newworkspace, user = self.request.user, role='owner')
 
+	def destroy(self, request, *args, **kwargs):
+		workspace = self.get_object()
+		Workspace.objects.filter(pk=workspace.pk).update(deleting=True)
+		invalidate_workspace_stats(workspace.id)
+		job = enqueue("workspaces.delete_workspace", user=request.user, workspace_id=workspace.id, shard=workspace._state.db)
+		return Response({"detail": "Workspace is being deleted.", "job": job.id}, status=202)
+
 	def get_permissions(self):
 		if self.action in ['destroy','add_member', 'change_role']:
 			return [HasWorkspaceAuthority()]
@@ -139,18 +165,40 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
 		member.save()
 		return Response({"detail": 'Role updated successfully.'}, status=200)
 
-class ProjectViewSet(viewsets.ModelViewSet):
+	@action(
+		detail=True,
+		methods=['get'],
+		url_path='stats')
+	def stats(self, request, pk=None):
+		workspace = self.get_object()
+		return Response(get_workspace_stats([workspace.id])[workspace.id], status=200)
+
+	@action(
+		detail=True,
+		methods=['get'],
+		url_path='deletion')
+	def deletion(self, request, pk=None):
+		workspace = self.get_object()
+		if not workspace.deleting:
+			raise NotFound({"detail": "Workspace is not being deleted."})
+		return Response(deletion_status(workspace=workspace), status=200)
+
+class ProjectViewSet(ShardedViewSetMixin, OptimisticUpdateMixin, viewsets.ModelViewSet):
 	serializer_class = ProjectSerializer
 	pagination_class = Pagination
 
-	def get_queryset(self):
+	def build_queryset(self):
 		user = self.request.user
+		tasks = Prefetch("tasks", queryset=Task.objects.order_by("status", "rank", "id"))
+		projects = Project.objects.filter(workspace__deleting=False)
+		if self.action != 'deletion':
+			projects = projects.filter(deleting=False)
 
 		if user.is_superuser or user.is_staff:
-			return Project.objects.all().prefetch_related("tasks")
+			return projects.prefetch_related(tasks)
 
 		user_workspaces = Workspace.objects.filter(memberships__user=user)
-		return Project.objects.filter(workspace__in=user_workspaces).prefetch_related("tasks")
+		return projects.filter(workspace__in=user_workspaces).prefetch_related(tasks)
 
 	def get_serializer_class(self):
 		if (self.action == 'retrieve'):
@@ -164,6 +212,24 @@ class ProjectViewSet(viewsets.ModelViewSet):
 			return [CanEditWorkspace()]
 		else:
 			return [IsAuthenticated()]
+
+	def destroy(self, request, *args, **kwargs):
+		project = self.get_object()
+		Project.objects.filter(pk=project.pk).update(deleting=True)
+		invalidate_workspace_stats(project.workspace_id)
+		job = enqueue("workspaces.delete_project", user=request.user, project_id=project.id, shard=project._state.db)
+		return Response({"detail": "Project is being deleted.", "job": job.id}, status=202)
+
+	@action(
+		detail=True,
+		methods=['get'],
+		url_path='deletion')
+	def deletion(self, request, pk=None):
+		project = self.get_object()
+		if not project.deleting:
+			raise NotFound({"detail": "Project is not being deleted."})
+		return Response(deletion_status(project=project), status=200)
+
 	@action(
 		detail=True,
 		methods=['post'],
@@ -177,34 +243,218 @@ class ProjectViewSet(viewsets.ModelViewSet):
 			raise ValidationError({"detail": "task name is required."})
 		if not description:
 			description = ""
-		task = Task.objects.create(name=name, project=project, description=description, status=Task.StatusChoices.NOT_STARTED)
+		task = Task.objects.create(name=name, project=project, description=description, status=Task.StatusChoices.NOT_STARTED, rank=rank_at_end(project.id, Task.StatusChoices.NOT_STARTED))
+		invalidate_workspace_stats(project.workspace_id)
 		if task:
 			return Response({"detail": "Created task"}, status=201)
 		else:
 			raise ValidationError({"detail": "Internal error"})
 
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ShardedViewSetMixin, OptimisticUpdateMixin, viewsets.ModelViewSet):
 	serializer_class = TaskSerializer
 	permission_classes = [IsAuthenticated]
 	pagination_class = Pagination
 
 	def get_permissions(self):
-		if self.action in ['update', 'partial_update', 'destroy']:
+		if self.action in ['update', 'partial_update', 'destroy', 'move']:
 			return [CanEditWorkspace()]
 		else:
 			return [IsAuthenticated()]
 
-	def get_queryset(self):
+	def build_queryset(self):
 		user = self.request.user
 
-		if user.is_superuser or user.is_staff:
-			return Task.objects.all()
-		return Task.objects.filter(project__workspace__memberships__user=user)
+		queryset = Task.objects.filter(project__deleting=False, project__workspace__deleting=False)
+		if not (user.is_superuser or user.is_staff):
+			queryset = queryset.filter(project__workspace__memberships__user=user)
+		label = self.request.query_params.get('label')
+		if label:
+			try:
+				label = int(label)
+			except ValueError:
+				raise ValidationError({"detail": "label must be the id of a label."})
+			# joins only the labels through table, looked up by its tasklabel_id index
+			queryset = queryset.filter(labels__id=label)
+		return queryset.order_by('project', 'status', 'rank', 'id')
 
 	def create(self, request, *args, **kwargs):
 		return Response({"detail": "Use /projects/<project_id>/create_task/ instead."}, status=400)
 
+	def perform_update(self, serializer):
+		task = serializer.instance
+		old_workspace_id = task.project.workspace_id
+		data = serializer.validated_data
+		project = data.get('project', task.project)
+		status = data.get('status', task.status)
+		moved = (project.id, status) != (task.project_id, task.status)
+		if moved:
+			# the old rank means nothing in another column, the task goes to the bottom of it
+			data['rank'] = rank_at_end(project.id, status)
+		super().perform_update(serializer)
+		if len(data.get('rank', '')) > settings.RANK_REBALANCE_LENGTH:
+			rebalance_ranks_later(project.id, status, shard=task._state.db)
+		# a rename leaves the counts alone, no second write for it
+		if moved:
+			invalidate_workspace_stats(old_workspace_id)
+			if task.project.workspace_id != old_workspace_id:
+				invalidate_workspace_stats(task.project.workspace_id)
+
+	def perform_destroy(self, instance):
+		workspace_id = instance.project.workspace_id
+		instance.delete()
+		invalidate_workspace_stats(workspace_id)
+
+	def get_neighbour_ranks(self, task, status, after, before):
+		column = Task.objects.filter(project_id=task.project_id, status=status).exclude(pk=task.pk)
+		ranks = dict(column.filter(pk__in=[pk for pk in (after, before) if pk]).values_list("id", "rank"))
+		if (after and after not in ranks) or (before and before not in ranks):
+			raise ValidationError({"detail": "after/before must be tasks in the same project and status."})
+		lower = ranks.get(after)
+		upper = ranks.get(before)
+		if after and not before:
+			upper = column.filter(rank__gt=lower).order_by("rank").values_list("rank", flat=True).first()
+		elif before and not after:
+			lower = column.filter(rank__lt=upper).order_by("-rank").values_list("rank", flat=True).first()
+		elif not after and not before:
+			lower = column.order_by("-rank").values_list("rank", flat=True).first()
+		return lower, upper
+
+	@action(
+		detail=True,
+		methods=['post'],
+		url_path='move')
+	def move(self, request, pk=None):
+		task = self.get_object()
+		serializer = MoveTaskSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		status = serializer.validated_data.get('status', task.status)
+		after = serializer.validated_data.get('after')
+		before = serializer.validated_data.get('before')
+		lower, upper = self.get_neighbour_ranks(task, status, after, before)
+		if lower is not None and upper is not None and lower > upper:
+			raise ValidationError({"detail": "after must be above before."})
+		if upper == "" or lower == upper:
+			# neighbours share a rank (tasks created outside the api), spread the column once and retry
+			rebalance_ranks(task.project_id, status, shard=task._state.db)
+			lower, upper = self.get_neighbour_ranks(task, status, after, before)
+		rank = rank_between(lower, upper)
+		old_status = task.status
+		# only the moved task is written, its neighbours keep their ranks
+		self.versioned_update(task, status=status, rank=rank)
+		if status != old_status:
+			invalidate_workspace_stats(task.project.workspace_id)
+		if len(rank) > settings.RANK_REBALANCE_LENGTH:
+			rebalance_ranks_later(task.project_id, status, shard=task._state.db)
+		return Response({"id": task.id, "status": status, "rank": rank, "version": task.version}, status=200)
+
+
+class TaskLabelViewSet(ShardedViewSetMixin, viewsets.ModelViewSet):
+	serializer_class = TaskLabelSerializer
+	pagination_class = Pagination
+
+	def get_workspace_pk(self):
+		return self.kwargs['workspace_pk']
+
+	def build_queryset(self):
+		user = self.request.user
+		queryset = TaskLabel.objects.filter(workspace_id=self.kwargs['workspace_pk'], workspace__deleting=False).order_by('text')
+		if user.is_superuser or user.is_staff:
+			return queryset
+		return queryset.filter(workspace__memberships__user=user)
+
+	def get_permissions(self):
+		if self.action in ['create', 'update', 'partial_update', 'destroy', 'assign', 'unassign']:
+			return [CanEditWorkspace()]
+		else:
+			return [IsAuthenticated()]
+
+	def get_workspace(self):
+		user = self.request.user
+		workspaces = Workspace.objects.filter(deleting=False)
+		if not (user.is_superuser or user.is_staff):
+			workspaces = workspaces.filter(memberships__user=user)
+		workspace = workspaces.filter(pk=self.kwargs['workspace_pk']).first()
+		if not workspace:
+			raise NotFound({"detail": "Workspace not found."})
+		return workspace
+
+	def check_unique_text(self, workspace_id, text, exclude=None):
+		labels = TaskLabel.objects.filter(workspace_id=workspace_id, text=text)
+		if exclude:
+			labels = labels.exclude(pk=exclude.pk)
+		if labels.exists():
+			raise ValidationError({"detail": "Label already exists in this workspace."})
+
+	def save_unique(self, serializer, **kwargs):
+		'''check_unique_text gives the nice error, two requests can pass it at once and then the unique index decides'''
+		try:
+			with transaction.atomic(using=get_active_shard()):
+				serializer.save(**kwargs)
+		except IntegrityError:
+			raise ValidationError({"detail": "Label already exists in this workspace."})
+
+	def perform_create(self, serializer):
+		workspace = self.get_workspace()
+		if not CanEditWorkspace().has_object_permission(self.request, self, workspace):
+			raise PermissionDenied({"detail": "Not allowed to create labels in this workspace."})
+		self.check_unique_text(workspace.id, serializer.validated_data.get('text', 'Label'))
+		self.save_unique(serializer, workspace=workspace)
+
+	def perform_update(self, serializer):
+		if 'text' in serializer.validated_data:
+			self.check_unique_text(serializer.instance.workspace_id, serializer.validated_data['text'], exclude=serializer.instance)
+		self.save_unique(serializer)
+
+	def get_label_tasks(self, request, label):
+		serializer = LabelTasksSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		return Task.objects.filter(
+			id__in=serializer.validated_data['tasks'],
+			project__workspace_id=label.workspace_id
+		).values_list('id', flat=True)
+
+	@action(
+		detail=True,
+		methods=['post'],
+		url_path='assign')
+	def assign(self, request, workspace_pk=None, pk=None):
+		label = self.get_object()
+		task_ids = list(self.get_label_tasks(request, label))
+		Through = Task.labels.through
+		# one INSERT for all tasks, rows that already exist are skipped by the unique (task, tasklabel) index
+		Through.objects.bulk_create(
+			[Through(task_id=task_id, tasklabel_id=label.id) for task_id in task_ids],
+			ignore_conflicts=True)
+		return Response({"detail": "Label added to tasks.", "tasks": task_ids}, status=200)
+
+	@action(
+		detail=True,
+		methods=['post'],
+		url_path='unassign')
+	def unassign(self, request, workspace_pk=None, pk=None):
+		label = self.get_object()
+		task_ids = self.get_label_tasks(request, label)
+		removed, _ = Task.labels.through.objects.filter(tasklabel_id=label.id, task_id__in=task_ids).delete()
+		return Response({"detail": "Label removed from tasks.", "removed": removed}, status=200)
+
+
+class StatsView(APIView):
+	'''Task counts per status for every workspace the user can see'''
+	permission_classes = [IsAuthenticated]
+
+	def get(self, request):
+		user = request.user
+		workspaces = []
+		for shard in user_shards(user):
+			with use_shard(shard):
+				workspace_ids = Workspace.objects.filter(deleting=False)
+				if not (user.is_superuser or user.is_staff):
+					workspace_ids = workspace_ids.filter(memberships__user=user)
+				workspaces += get_workspace_stats(workspace_ids.values_list("id", flat=True)).values()
+		by_status = {status: sum(w["by_status"][status] for w in workspaces) for status in Task.StatusChoices.values}
+		return Response({"total": sum(w["total"] for w in workspaces), "by_status": by_status, "workspaces": workspaces}, status=200)
+
 
 
 
@@ -3,6 +3,7 @@
 source venv/bin/activate
 
 ./backend/manage.py runserver &
+./backend/manage.py run_worker &
 
 cd frontend
 npm install